@@ -7,16 +7,16 @@ Expected CSV columns:
     Date of submission, Score, Max score, Autograded test results
 """
 
-import csv
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from zoneinfo import ZoneInfo
 
-import pandas as pd
-
 from .common import (
     build_student_score_maps,
+    clean_name_series,
     extract_username_from_email,
+    extract_usernames_series,
     find_email_column,
     find_name_columns,
     find_student_id_column,
@@ -25,9 +25,12 @@ from .common import (
     load_weights_csv,
     middle_name_matched as _middle_name_matched,
     normalize_student_id,
+    normalize_student_id_series,
     read_csv_with_trailing_comma_fix,
     recompute_averages,
     resolve_column,
+    wait_for_writes,
+    write_gradebook_csv,
 )
 from .merge import find_username_column, sort_assignment_columns
 
@@ -38,6 +41,17 @@ EXPECTED_COLUMNS = [
 ]
 
 
+# Text columns are read as strings without inference; Score/Max score keep
+# pandas' own int/float inference because their repr shows up in reports
+_ACTIVITY_DTYPES = {
+    'First name': str,
+    'Last name': str,
+    'Email': str,
+    'Class section': str,
+    'Autograded test results': str,
+}
+
+
 _LOCAL_TZ = ZoneInfo('America/New_York')
 
 
@@ -47,29 +61,35 @@ def _parse_due_date(due_date):
     Strings with a Z or UTC offset are parsed as-is.
     Strings without timezone info are treated as America/New_York local time.
     """
+    import pandas as pd
+
     dt = pd.to_datetime(due_date)
     if dt.tzinfo is None:
         dt = dt.tz_localize(_LOCAL_TZ)
     return dt.tz_convert('UTC')
 
 
-def _late_penalty_factor(submission_dt, due_dt, grace_limit=None, days_grace=0, hours_grace=0, penalty=0.2):
+def _late_penalty_factors(sub_dts, usernames, due_dt, grace_limit=None, days_grace=0, hours_grace=0,
+                          penalty=0.2, no_penalty_emails=None):
     """
-    Return the score multiplier for a submission relative to a due date.
+    Return the score multiplier for each submission relative to a due date.
 
     Grace window: days_grace days + hours_grace hours + 1 implicit hour.
     Beyond the grace window: flat deduction of `penalty`.
     If grace_limit set (days) and submission > grace_limit days late: 0.0.
+    Usernames in no_penalty_emails always get 1.0.
     """
-    delta_seconds = (submission_dt - due_dt).total_seconds()
-    grace_seconds = days_grace * 86400 + hours_grace * 3600 + 3600  # +1 h always
-    if delta_seconds <= grace_seconds:
-        return 1.0
-    if grace_limit is not None and delta_seconds > grace_limit * 86400:
-        return 0.0
-    return max(0.0, 1.0 - penalty)
-
+    import pandas as pd
 
+    delta_seconds = (sub_dts - due_dt).dt.total_seconds()
+    grace_seconds = days_grace * 86400 + hours_grace * 3600 + 3600  # +1 h always
+    factors = pd.Series(max(0.0, 1.0 - penalty), index=sub_dts.index)
+    if grace_limit is not None:
+        factors[delta_seconds > grace_limit * 86400] = 0.0
+    factors[delta_seconds <= grace_seconds] = 1.0
+    if no_penalty_emails:
+        factors[usernames.isin(no_penalty_emails)] = 1.0
+    return factors
 
 
 def _print_late_report(late_df, due_dt):
@@ -105,6 +125,19 @@ def _print_late_report(late_df, due_dt):
     print(f"   {rule}")
 
 
+def _best_submissions(df, by):
+    """
+    Return the submission with the largest *by* value for each Email.
+
+    Equivalent to df.loc[df.groupby('Email')[by].idxmax()] -- ties keep the
+    earliest row and the result is ordered by Email -- but done with a stable
+    sort and drop_duplicates instead of a grouped reduction.
+    """
+    ranked = df.dropna(subset=['Email']).sort_values(by, ascending=False, kind='stable')
+    best = ranked.drop_duplicates('Email', keep='first')
+    return best.sort_values('Email', kind='stable')
+
+
 def parse_activity_report(filepath, verbose=True, due_date=None, select='max', grace_limit=None,
                           no_penalty_emails=None, days_grace=0, hours_grace=0, penalty=0.2,
                           aliases=None):
@@ -129,12 +162,14 @@ def parse_activity_report(filepath, verbose=True, due_date=None, select='max', g
     Returns:
         DataFrame with one row per student, including a Percent column.
     """
+    import pandas as pd
+
     if select not in ('max', 'recent', 'pre-due'):
         raise ValueError(f"select must be 'max', 'recent', or 'pre-due', got '{select}'")
     if select == 'pre-due' and due_date is None:
         raise ValueError("--select pre-due requires --due to be set")
 
-    df = pd.read_csv(filepath, encoding='utf-8-sig')
+    df = pd.read_csv(filepath, encoding='utf-8-sig', dtype=_ACTIVITY_DTYPES)
 
     missing = [col for col in EXPECTED_COLUMNS if col not in df.columns]
     if missing:
@@ -168,7 +203,7 @@ def parse_activity_report(filepath, verbose=True, due_date=None, select='max', g
                   f"Late (penalised): {len(late_only_emails)}")
 
         if len(on_time) > 0:
-            best = df.loc[on_time.groupby('Email')['Score'].idxmax()].copy()
+            best = _best_submissions(on_time, 'Score')
         else:
             best = pd.DataFrame(columns=df.columns)
         best['_PenaltyFactor'] = 1.0  # on-time: no penalty
@@ -176,15 +211,12 @@ def parse_activity_report(filepath, verbose=True, due_date=None, select='max', g
         if late_only_emails:
             late_rows = df[df['Email'].isin(late_only_emails)].copy()
             # Pick the best-scoring submission for each late student
-            late_rows = late_rows.loc[
-                late_rows.groupby('Email')['Score'].idxmax()
-            ].copy()
+            late_rows = _best_submissions(late_rows, 'Score')
             late_rows['_LateOnly'] = True
-            late_rows['_PenaltyFactor'] = [
-                1.0 if (no_penalty_emails and extract_username_from_email(e) in no_penalty_emails)
-                else _late_penalty_factor(s, due_dt, grace_limit, days_grace, hours_grace, penalty)
-                for s, e in zip(late_rows['_SubDt'], late_rows['Email'])
-            ]
+            late_rows['_PenaltyFactor'] = _late_penalty_factors(
+                late_rows['_SubDt'], extract_usernames_series(late_rows['Email']), due_dt,
+                grace_limit, days_grace, hours_grace, penalty, no_penalty_emails,
+            )
             best = pd.concat([best, late_rows], ignore_index=True)
             best['_LateOnly'] = best['_LateOnly'].fillna(False)
 
@@ -194,24 +226,21 @@ def parse_activity_report(filepath, verbose=True, due_date=None, select='max', g
     else:
         # --- max / recent ---
         if select == 'recent':
-            idx = df.groupby('Email')['_SubDt'].idxmax()
+            best = _best_submissions(df, '_SubDt')
             if verbose:
                 print(f"   Selection: most recent submission")
         else:
-            idx = df.groupby('Email')['Score'].idxmax()
+            best = _best_submissions(df, 'Score')
             if verbose:
                 print(f"   Selection: highest score")
 
-        best = df.loc[idx].copy()
-
         # Apply late penalty
         if due_date is not None:
             due_dt = _parse_due_date(due_date)
-            best['_PenaltyFactor'] = [
-                1.0 if (no_penalty_emails and extract_username_from_email(e) in no_penalty_emails)
-                else _late_penalty_factor(s, due_dt, grace_limit, days_grace, hours_grace, penalty)
-                for s, e in zip(best['_SubDt'], best['Email'])
-            ]
+            best['_PenaltyFactor'] = _late_penalty_factors(
+                best['_SubDt'], extract_usernames_series(best['Email']), due_dt,
+                grace_limit, days_grace, hours_grace, penalty, no_penalty_emails,
+            )
             best['_PenalizedScore'] = best['Score'] * best['_PenaltyFactor']
             score_col = '_PenalizedScore'
 
@@ -225,7 +254,7 @@ def parse_activity_report(filepath, verbose=True, due_date=None, select='max', g
             score_col = 'Score'
 
     best['Percent'] = (best[score_col] / best['Max score'] * 100).round(2)
-    best['Username'] = best['Email'].apply(extract_username_from_email)
+    best['Username'] = extract_usernames_series(best['Email'])
     if aliases:
         best['Username'] = best['Username'].apply(lambda u: aliases.get(u, u))
     best = best.sort_values(['Last name', 'First name']).reset_index(drop=True)
@@ -240,8 +269,45 @@ def parse_activity_report(filepath, verbose=True, due_date=None, select='max', g
 
 
 
+def _compute_usernames(df, username_col=None, email_col=None):
+    """
+    Return the lowercased username of every gradebook row as an object Series.
+
+    The username column is used wherever it has a value; other rows fall back
+    to the username part of the email column, or None without one.
+    """
+    import pandas as pd
+
+    if email_col:
+        usernames = extract_usernames_series(df[email_col])
+    else:
+        usernames = pd.Series([None] * len(df), index=df.index, dtype=object)
+    if username_col:
+        present = df[username_col].notna()
+        usernames[present] = df.loc[present, username_col].astype(str).str.strip().str.lower()
+    return usernames
+
+
+def _lookup_scores(score_map, keys):
+    """
+    Look up a Series of keys in a {key: score} map with one hash probe.
+
+    Returns:
+        (hit, scores): boolean Series marking keys found in *score_map*, and an
+        object Series holding their scores (None where not found)
+    """
+    import numpy as np
+    import pandas as pd
+
+    values = np.empty(len(score_map) + 1, dtype=object)
+    values[:-1] = list(score_map.values())  # trailing None is picked by misses (-1)
+    pos = pd.Index(list(score_map), dtype=object).get_indexer(keys)
+    return pd.Series(pos >= 0, index=keys.index), pd.Series(values[pos], index=keys.index)
+
+
 def apply_scores_to_gradebook(df, score_map, column_pattern, verbose=True,
-                               id_score_map=None, name_score_map=None, force=False):
+                               id_score_map=None, name_score_map=None, force=False,
+                               username_col=None, email_col=None, usernames=None):
     """
     Write scores from student lookup maps into a single gradebook DataFrame.
 
@@ -257,6 +323,9 @@ def apply_scores_to_gradebook(df, score_map, column_pattern, verbose=True,
         verbose: Print detailed progress
         id_score_map: Optional dict mapping student_id -> score
         name_score_map: Optional dict mapping (last_lower, first_lower) -> score
+        username_col: Gradebook username column, if already looked up
+        email_col: Gradebook email column, if already looked up
+        usernames: Row usernames from _compute_usernames(df), if already computed
 
     Returns:
         (column_name, rows_updated) tuple
@@ -264,55 +333,65 @@ def apply_scores_to_gradebook(df, score_map, column_pattern, verbose=True,
     Raises:
         ValueError: If column_pattern does not match exactly one column.
     """
+    import pandas as pd
+
     column_name = resolve_column(df, column_pattern)
     if verbose and column_pattern != column_name:
         print(f"      Resolved '{column_pattern}' -> '{column_name}'")
     df[column_name] = df[column_name].astype(object)
 
-    lec_email_col = find_email_column(df)
-    lec_username_col = find_username_column(df)
     lec_id_col = find_student_id_column(df) if id_score_map else None
     lec_first_col, lec_last_col = find_name_columns(df) if name_score_map else (None, None)
 
-    updated = 0
+    scores = pd.Series([None] * len(df), index=df.index, dtype=object)
+    found = pd.Series(False, index=df.index)
     name_matched = 0
 
-    for idx, row in df.iterrows():
-        score = None
-
-        # 1. Student ID
-        if lec_id_col and id_score_map:
-            student_id = normalize_student_id(row[lec_id_col])
-            if student_id and student_id in id_score_map:
-                score = id_score_map[student_id]
-
-        # 2. Username / email
-        if score is None:
-            username = None
-            if lec_username_col and not pd.isna(row[lec_username_col]):
-                username = str(row[lec_username_col]).strip().lower()
-            elif lec_email_col:
-                username = extract_username_from_email(row[lec_email_col])
-            if username and username in score_map:
-                score = score_map[username]
-
-        # 3. (Last, First) name
-        if score is None and name_score_map and lec_last_col and lec_first_col:
-            last = str(row[lec_last_col]).strip().lower() if pd.notna(row[lec_last_col]) else ''
-            first = str(row[lec_first_col]).strip().lower() if pd.notna(row[lec_first_col]) else ''
-            if last and first and (last, first) in name_score_map:
-                score = name_score_map[(last, first)]
-                name_matched += 1
-
-        if score is not None:
-            existing = df.at[idx, column_name]
-            try:
-                existing_val = float(existing)
-            except (ValueError, TypeError):
-                existing_val = None
-            if force or existing_val is None or score > existing_val:
-                df.at[idx, column_name] = f"{score:.2f}"
-                updated += 1
+    # 1. Student ID
+    if lec_id_col and id_score_map:
+        ids = normalize_student_id_series(df[lec_id_col])
+        in_map, id_scores = _lookup_scores(id_score_map, ids)
+        hit = ids.astype(bool) & in_map
+        scores[hit] = id_scores[hit]
+        found |= hit
+
+    # 2. Username / email
+    if usernames is None:
+        usernames = _compute_usernames(
+            df, username_col or find_username_column(df), email_col or find_email_column(df)
+        )
+    in_map, username_scores = _lookup_scores(score_map, usernames)
+    hit = ~found & usernames.astype(bool) & in_map
+    scores[hit] = username_scores[hit]
+    found |= hit
+
+    # 3. (Last, First) name
+    if name_score_map and lec_last_col and lec_first_col:
+        lasts = clean_name_series(df[lec_last_col])
+        firsts = clean_name_series(df[lec_first_col])
+        name_keys = pd.Series(list(zip(lasts, firsts)), index=df.index, dtype=object)
+        hit = ~found & pd.Series(
+            [bool(last and first) and (last, first) in name_score_map for last, first in name_keys],
+            index=df.index,
+        )
+        scores[hit] = [name_score_map[key] for key in name_keys[hit]]
+        found |= hit
+        name_matched = int(hit.sum())
+
+    # Only overwrite a cell that is unparseable or holds a lower score (or --force)
+    existing = df.loc[found, column_name]
+    existing_vals = pd.to_numeric(existing, errors='coerce')
+    unparseable = pd.Series(False, index=existing.index)
+    for idx in existing.index[existing_vals.isna() & existing.notna()]:
+        try:
+            existing_vals[idx] = float(existing[idx])
+        except (ValueError, TypeError):
+            unparseable[idx] = True
+    to_write = force | unparseable | (scores[found].astype(float) > existing_vals)
+    write_idx = to_write.index[to_write.to_numpy()]
+    if len(write_idx):
+        df.loc[write_idx, column_name] = [f"{score:.2f}" for score in scores[write_idx]]
+    updated = len(write_idx)
 
     if verbose and name_matched > 0:
         print(f"      Name-matched: {name_matched} student(s) — verify these")
@@ -390,6 +469,18 @@ def run_activity(input_files, lecture_files, column_names, output_dir='.', quiet
     print("\nDone!")
 
 
+def _load_gradebooks(lecture_files):
+    """
+    Parse each lecture gradebook once.
+
+    Returns:
+        (lecture_paths, gradebooks): {file_name: Path} and {file_name: DataFrame}
+    """
+    lecture_paths = {Path(fp).name: Path(fp) for fp in lecture_files}
+    gradebooks = {name: read_csv_with_trailing_comma_fix(fp) for name, fp in lecture_paths.items()}
+    return lecture_paths, gradebooks
+
+
 def _username_to_id_map(gradebook_dfs):
     """Build {username: student_id} mapping from loaded gradebook DataFrames."""
     result = {}
@@ -397,19 +488,10 @@ def _username_to_id_map(gradebook_dfs):
         id_col = find_student_id_column(df)
         if not id_col:
             continue
-        un_col = find_username_column(df)
-        em_col = find_email_column(df)
-        for _, row in df.iterrows():
-            sid = normalize_student_id(row[id_col])
-            if not sid:
-                continue
-            username = None
-            if un_col and not pd.isna(row.get(un_col)):
-                username = str(row[un_col]).strip().lower()
-            elif em_col:
-                username = extract_username_from_email(row[em_col])
-            if username:
-                result[username] = sid
+        ids = normalize_student_id_series(df[id_col])
+        usernames = _compute_usernames(df, find_username_column(df), find_email_column(df))
+        keep = ids.astype(bool) & usernames.astype(bool)
+        result.update(zip(usernames[keep], ids[keep]))
     return result
 
 
@@ -422,24 +504,19 @@ def _username_to_section_map(gradebook_dfs):
             lab_col = resolve_column(df, 'Lab section')
         except ValueError:
             continue
-        un_col = find_username_column(df)
-        em_col = find_email_column(df)
+        labs = df[lab_col]
+        sections = labs[labs.notna()].astype(str).str.strip()
+        sections = sections[(sections != '') & (sections.str.lower() != 'nan')]
+        if sections.empty:
+            continue
+        usernames = _compute_usernames(df, find_username_column(df), find_email_column(df))[sections.index]
+        has_username = usernames.astype(bool)
+        un_map.update(zip(usernames[has_username], sections[has_username]))
         id_col = find_student_id_column(df)
-        for _, row in df.iterrows():
-            section = str(row[lab_col]).strip() if pd.notna(row[lab_col]) else ''
-            if not section or section.lower() == 'nan':
-                continue
-            username = None
-            if un_col and not pd.isna(row.get(un_col)):
-                username = str(row[un_col]).strip().lower()
-            elif em_col:
-                username = extract_username_from_email(row[em_col])
-            if username:
-                un_map[username] = section
-            if id_col:
-                sid = normalize_student_id(row[id_col])
-                if sid:
-                    id_map[sid] = section
+        if id_col:
+            ids = normalize_student_id_series(df.loc[sections.index, id_col])
+            has_id = ids.astype(bool)
+            id_map.update(zip(ids[has_id], sections[has_id]))
     return un_map, id_map
 
 
@@ -453,6 +530,8 @@ def _build_audit_records(best, due_dt, u2id, select, days_grace=0, hours_grace=0
         u2id:    {username: student_id} mapping built from gradebooks
         select:  'max', 'recent', or 'pre-due'
     """
+    import pandas as pd
+
     records = []
     has_penalty = '_PenaltyFactor' in best.columns
 
@@ -528,16 +607,21 @@ def _dedup_late_records(records):
     return list(by_email.values())
 
 
-def _build_late_records(best, due_dt, gradebook_dfs, days_grace=0, hours_grace=0):
+def _build_late_records(best, due_dt, username_to_id, section_maps, days_grace=0, hours_grace=0):
     """
     Build late submission records from a best-submission DataFrame.
 
     Returns a list of dicts with the same columns as the assignment late report.
     Works for both max/recent mode (_PenaltyFactor present) and pre-due mode
     (_LateOnly present).
+
+    Args:
+        username_to_id: {username: student_id} from _username_to_id_map
+        section_maps: (un_to_section, id_to_section) from _username_to_section_map
     """
-    username_to_id = _username_to_id_map(gradebook_dfs)
-    un_to_section, id_to_section = _username_to_section_map(gradebook_dfs)
+    import pandas as pd
+
+    un_to_section, id_to_section = section_maps
     grace_seconds = days_grace * 86400 + hours_grace * 3600 + 3600  # +1 h always
 
     records = []
@@ -583,20 +667,12 @@ def _exempt_usernames_from_ids(gradebook_dfs, no_penalty_ids):
     exempt = set()
     for df in gradebook_dfs.values():
         id_col = find_student_id_column(df)
-        un_col = find_username_column(df)
-        em_col = find_email_column(df)
         if not id_col:
             continue
-        for _, row in df.iterrows():
-            sid = normalize_student_id(row[id_col])
-            if sid and sid in no_penalty_ids:
-                username = None
-                if un_col and not pd.isna(row.get(un_col)):
-                    username = str(row[un_col]).strip().lower()
-                elif em_col:
-                    username = extract_username_from_email(row[em_col])
-                if username:
-                    exempt.add(username)
+        ids = normalize_student_id_series(df[id_col])
+        usernames = _compute_usernames(df, find_username_column(df), find_email_column(df))
+        keep = ids.astype(bool) & ids.isin(list(no_penalty_ids)) & usernames.astype(bool)
+        exempt.update(usernames[keep])
     return exempt
 
 
@@ -610,25 +686,32 @@ def _gradebook_usernames(gradebook_dfs):
     usernames = set()
     for df in gradebook_dfs.values():
         un_col = find_username_column(df)
-        em_col = find_email_column(df)
+        row_usernames = _compute_usernames(df, un_col, find_email_column(df))
+        # A username-column value counts even when blank; email fallbacks only when non-empty
+        keep = row_usernames.astype(bool)
+        if un_col:
+            keep |= df[un_col].notna()
+        usernames.update(row_usernames[keep])
         first_col, last_col = find_name_columns(df)
-        for _, row in df.iterrows():
-            if un_col and not pd.isna(row.get(un_col)):
-                usernames.add(str(row[un_col]).strip().lower())
-            elif em_col:
-                u = extract_username_from_email(row[em_col])
-                if u:
-                    usernames.add(u)
-            if first_col and last_col:
-                first = str(row[first_col]).strip().lower() if pd.notna(row[first_col]) else ''
-                last = str(row[last_col]).strip().lower() if pd.notna(row[last_col]) else ''
-                if first and last:
-                    usernames.add(f"{first}.{last}")
+        if first_col and last_col:
+            firsts = clean_name_series(df[first_col])
+            lasts = clean_name_series(df[last_col])
+            named = (firsts != '') & (lasts != '')
+            usernames.update(firsts[named] + '.' + lasts[named])
     return usernames
 
 
+def _finalize_gradebook(df, output_path, weights=None):
+    """Sort assignment columns, recompute averages, and write one gradebook."""
+    df = sort_assignment_columns(df)
+    recompute_averages(df, weights=weights)
+    write_gradebook_csv(df, output_path)
+
+
 def _write_orphan_report(score_map, all_lecture_usernames, label, out):
     """Write orphaned students (in score_map but not in any gradebook) to a CSV."""
+    import pandas as pd
+
     orphaned = [
         {'Username': u, 'Score': score_map[u]}
         for u in sorted(set(score_map.keys()) - all_lecture_usernames)
@@ -642,23 +725,67 @@ def _write_orphan_report(score_map, all_lecture_usernames, label, out):
               f"in any gradebook — see {orphaned_path}")
 
 
+def _combine_report_bests(report_bests):
+    """
+    Combine the per-report best submissions of an aggregated activity run.
+
+    For every username, and every (last, first) name, the Percent of the row
+    with the highest raw score percentage wins; the earliest row wins ties.
+
+    Returns:
+        (score_map, count_map, name_score_map)
+    """
+    import numpy as np
+    import pandas as pd
+
+    if not report_bests:
+        return {}, {}, {}
+
+    rows = pd.concat(report_bests, ignore_index=True)
+
+    def top_rows(keyed, keys):
+        """Winning row per key, in the order the old running-max loop chose it."""
+        # A NaN raw percentage never beats a score, so later NaN rows are
+        # dropped; a key's first row keeps its place even when NaN, since no
+        # score beats it either
+        raw = keyed['_RawPct']
+        first_nan = raw.isna() & ~keyed.duplicated(keys)
+        rank = raw.mask(first_nan, np.inf)
+        return (
+            keyed.assign(_Rank=rank)[rank.notna()]
+            .sort_values('_Rank', ascending=False, kind='stable')
+            .drop_duplicates(keys)
+        )
+
+    usernames = rows.loc[rows['Username'].astype(bool), 'Username']
+    first_seen = usernames.drop_duplicates()
+    top = top_rows(rows[rows['Username'].astype(bool)], 'Username').set_index('Username')['Percent']
+    score_map = top.reindex(first_seen).to_dict()
+    count_map = usernames.value_counts(dropna=False).reindex(first_seen).to_dict()
+
+    named = top_rows(rows[(rows['_Last'] != '') & (rows['_First'] != '')], ['_Last', '_First'])
+    name_score_map = dict(zip(zip(named['_Last'], named['_First']), named['Percent']))
+
+    return score_map, count_map, name_score_map
+
+
 def _run_aggregated(input_files, lecture_files, column_name, out, verbose, due_date=None, select='max', force=False, grace_limit=None, penalty=0.2, weights=None, no_penalty_ids=None, audit_log=None, args_dict=None, days_grace=0, hours_grace=0, aliases=None):
     """Aggregate multiple reports into a single column, keeping max score per student."""
+    import pandas as pd
+
     n_activities = len(input_files)
 
     # Load gradebooks early so we can build the exempt-username set
-    lecture_paths = {Path(fp).name: Path(fp) for fp in lecture_files}
-    gradebook_dfs = {name: read_csv_with_trailing_comma_fix(fp) for name, fp in lecture_paths.items()}
+    lecture_paths, gradebook_dfs = _load_gradebooks(lecture_files)
     all_lecture_usernames = _gradebook_usernames(gradebook_dfs)
     exempt_usernames = _exempt_usernames_from_ids(gradebook_dfs, no_penalty_ids) or None
     u2id = _username_to_id_map(gradebook_dfs)
 
-    # username -> {max_score, count}
-    combined = {}
-    name_combined = {}  # (last_lower, first_lower) -> max_score
+    report_bests = []  # one frame of per-student bests per input file
     all_late_recs_flat = []  # accumulate across all input files; deduplicated at write time
 
     due_dt = _parse_due_date(due_date) if due_date is not None else None
+    section_maps = _username_to_section_map(gradebook_dfs) if due_dt is not None else None
 
     for input_file in input_files:
         filepath = Path(input_file)
@@ -667,7 +794,7 @@ def _run_aggregated(input_files, lecture_files, column_name, out, verbose, due_d
         best = parse_activity_report(filepath, verbose=verbose, due_date=due_date, select=select, grace_limit=grace_limit, no_penalty_emails=exempt_usernames, days_grace=days_grace, hours_grace=hours_grace, penalty=penalty, aliases=aliases)
 
         if due_dt is not None:
-            recs = _build_late_records(best, due_dt, gradebook_dfs, days_grace=days_grace, hours_grace=hours_grace)
+            recs = _build_late_records(best, due_dt, u2id, section_maps, days_grace=days_grace, hours_grace=hours_grace)
             all_late_recs_flat.extend(recs)
 
         if audit_log is not None:
@@ -681,36 +808,23 @@ def _run_aggregated(input_files, lecture_files, column_name, out, verbose, due_d
                     records=arecs,
                 )
 
+        # Keep only what _combine_report_bests ranks and maps on
+        report = best[['Username', 'Percent']].copy()
+        max_scores = best['Max score']
+        report['_RawPct'] = (best['Score'] / max_scores * 100).where(max_scores != 0, 0)
         first_col, last_col = find_name_columns(best)
+        if first_col and last_col:
+            report['_First'] = clean_name_series(best[first_col])
+            report['_Last'] = clean_name_series(best[last_col])
+        else:
+            report['_First'] = ''
+            report['_Last'] = ''
+        report_bests.append(report)
 
-        for _, row in best.iterrows():
-            username = row['Username']
-            pct = row['Percent']
-            raw_pct = (row['Score'] / row['Max score'] * 100) if row['Max score'] else 0
-
-            if username:
-                if username in combined:
-                    combined[username]['count'] += 1
-                    if raw_pct > combined[username]['raw_pct']:
-                        combined[username]['raw_pct'] = raw_pct
-                        combined[username]['max_score'] = pct
-                else:
-                    combined[username] = {'raw_pct': raw_pct, 'max_score': pct, 'count': 1}
-
-            if first_col and last_col:
-                first = str(row[first_col]).strip().lower() if pd.notna(row[first_col]) else ''
-                last = str(row[last_col]).strip().lower() if pd.notna(row[last_col]) else ''
-                if first and last:
-                    key = (last, first)
-                    if key not in name_combined or raw_pct > name_combined[key]['raw_pct']:
-                        name_combined[key] = {'raw_pct': raw_pct, 'score': pct}
+    score_map, count_map, name_score_map = _combine_report_bests(report_bests)
 
     if verbose:
-        print(f"\n   Aggregated {len(combined)} students across {n_activities} reports")
-
-    score_map = {u: v['max_score'] for u, v in combined.items()}
-    count_map = {u: v['count'] for u, v in combined.items()}
-    name_score_map = {k: v['score'] for k, v in name_combined.items()}
+        print(f"\n   Aggregated {len(score_map)} students across {n_activities} reports")
 
     if all_late_recs_flat:
         deduped = _dedup_late_records(all_late_recs_flat)
@@ -723,42 +837,35 @@ def _run_aggregated(input_files, lecture_files, column_name, out, verbose, due_d
     elif due_date is not None:
         print("\nNo late submissions.")
 
+    # One "count/total" label per distinct count, shared by every gradebook
+    count_labels = {c: f"{c}/{n_activities}" for c in set(count_map.values())}
+    submitted_map = {u: count_labels[c] for u, c in count_map.items()}
+
     print("\nWriting output files:")
-    for lecture_name, df in gradebook_dfs.items():
-        if verbose:
-            print(f"\n   -> {lecture_name} ({len(df)} students)")
+    writes = []
+    with ThreadPoolExecutor() as pool:
+        for lecture_name, df in gradebook_dfs.items():
+            if verbose:
+                print(f"\n   -> {lecture_name} ({len(df)} students)")
 
-        resolved_name, updated = apply_scores_to_gradebook(
-            df, score_map, column_name, verbose=verbose,
-            name_score_map=name_score_map, force=force,
-        )
-        count_col = "Number Submitted"
-
-        # Add submission count column
-        lec_email_col = find_email_column(df)
-        lec_username_col = find_username_column(df)
-        df[count_col] = ''
-        for idx, row in df.iterrows():
-            username = None
-            if lec_username_col and not pd.isna(row[lec_username_col]):
-                username = str(row[lec_username_col]).strip().lower()
-            elif lec_email_col:
-                username = extract_username_from_email(row[lec_email_col])
-            if username and username in count_map:
-                df.at[idx, count_col] = f"{count_map[username]}/{n_activities}"
+            usernames = _compute_usernames(df, find_username_column(df), find_email_column(df))
+            resolved_name, updated = apply_scores_to_gradebook(
+                df, score_map, column_name, verbose=verbose,
+                name_score_map=name_score_map, force=force, usernames=usernames,
+            )
+            count_col = "Number Submitted"
 
-        if verbose:
-            print(f"      Updated: {updated}")
+            # Add submission count column
+            df[count_col] = usernames.map(submitted_map).fillna('')
 
-        unnamed_cols = [col for col in df.columns if 'Unnamed' in str(col)]
-        if unnamed_cols:
-            df = df.drop(columns=unnamed_cols)
-        df = sort_assignment_columns(df)
+            if verbose:
+                print(f"      Updated: {updated}")
 
-        recompute_averages(df, weights=weights)
-        output_path = lecture_paths[lecture_name]
-        df.to_csv(output_path, index=False, encoding='utf-8-sig', quoting=csv.QUOTE_ALL)
-        print(f"   {output_path}")
+            output_path = lecture_paths[lecture_name]
+            writes.append((output_path, pool.submit(_finalize_gradebook, df, output_path, weights)))
+            print(f"   {output_path}")
+    if wait_for_writes(writes):
+        sys.exit(1)
 
     _write_orphan_report(score_map, all_lecture_usernames, column_name, out)
 
@@ -769,8 +876,14 @@ def _run_aggregated(input_files, lecture_files, column_name, out, verbose, due_d
 
 def _run_per_column(input_files, lecture_files, column_names, out, verbose, due_date=None, select='max', force=False, grace_limit=None, penalty=0.2, weights=None, no_penalty_ids=None, audit_log=None, args_dict=None, days_grace=0, hours_grace=0, aliases=None):
     """Each report gets its own column in the gradebook."""
-    lecture_paths = {Path(fp).name: Path(fp) for fp in lecture_files}
-    gradebooks = {name: read_csv_with_trailing_comma_fix(fp) for name, fp in lecture_paths.items()}
+    import pandas as pd
+
+    lecture_paths, gradebooks = _load_gradebooks(lecture_files)
+    # Gradebook rows never change between reports, so resolve usernames once
+    gradebook_usernames = {
+        name: _compute_usernames(df, find_username_column(df), find_email_column(df))
+        for name, df in gradebooks.items()
+    }
 
     all_lecture_usernames = _gradebook_usernames(gradebooks)
     exempt_usernames = _exempt_usernames_from_ids(gradebooks, no_penalty_ids) or None
@@ -778,6 +891,7 @@ def _run_per_column(input_files, lecture_files, column_names, out, verbose, due_
 
     all_late_records = {}  # column_name -> list of late record dicts
     due_dt = _parse_due_date(due_date) if due_date is not None else None
+    section_maps = _username_to_section_map(gradebooks) if due_dt is not None else None
 
     for input_file, column_name in zip(input_files, column_names):
         filepath = Path(input_file)
@@ -786,7 +900,7 @@ def _run_per_column(input_files, lecture_files, column_names, out, verbose, due_
         best = parse_activity_report(filepath, verbose=verbose, due_date=due_date, select=select, grace_limit=grace_limit, no_penalty_emails=exempt_usernames, days_grace=days_grace, hours_grace=hours_grace, penalty=penalty, aliases=aliases)
 
         if due_dt is not None:
-            recs = _build_late_records(best, due_dt, gradebooks, days_grace=days_grace, hours_grace=hours_grace)
+            recs = _build_late_records(best, due_dt, u2id, section_maps, days_grace=days_grace, hours_grace=hours_grace)
             if recs:
                 all_late_records[column_name] = recs
 
@@ -809,6 +923,7 @@ def _run_per_column(input_files, lecture_files, column_names, out, verbose, due_
             _, updated = apply_scores_to_gradebook(
                 df, score_map, column_name, verbose=verbose,
                 id_score_map=id_map, name_score_map=name_map, force=force,
+                usernames=gradebook_usernames[lecture_name],
             )
             if verbose:
                 print(f"      Updated: {updated}")
@@ -828,16 +943,14 @@ def _run_per_column(input_files, lecture_files, column_names, out, verbose, due_
         print("\nNo late submissions.")
 
     print("\nWriting output files:")
-    for lecture_name, df in gradebooks.items():
-        unnamed_cols = [col for col in df.columns if 'Unnamed' in str(col)]
-        if unnamed_cols:
-            df = df.drop(columns=unnamed_cols)
-        df = sort_assignment_columns(df)
-
-        recompute_averages(df, weights=weights)
-        output_path = lecture_paths[lecture_name]
-        df.to_csv(output_path, index=False, encoding='utf-8-sig', quoting=csv.QUOTE_ALL)
-        print(f"   {output_path}")
+    writes = []
+    with ThreadPoolExecutor() as pool:
+        for lecture_name, df in gradebooks.items():
+            output_path = lecture_paths[lecture_name]
+            writes.append((output_path, pool.submit(_finalize_gradebook, df, output_path, weights)))
+            print(f"   {output_path}")
+    if wait_for_writes(writes):
+        sys.exit(1)
 
     if audit_log is not None:
         audit_log.save()
@@ -3,10 +3,10 @@ Assignment scorer - processes zyBooks per-assignment report CSVs, applies
 late penalties from a due-dates table, and updates BBLearn lecture gradebooks.
 """
 
-import csv
 import math
 import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from zoneinfo import ZoneInfo
 
@@ -14,43 +14,51 @@ import pandas as pd
 
 from .common import (
     extract_username_from_email,
+    extract_usernames_series,
     find_email_column,
+    find_name_columns,
     find_student_id_column,
     fmt_late,
     load_aliases_csv,
     load_weights_csv,
     middle_name_matched as _middle_name_matched,
     normalize_student_id,
+    normalize_student_id_series,
+    parse_score_column,
     read_csv_with_trailing_comma_fix,
     recompute_averages,
     resolve_column,
+    write_gradebook_csv,
 )
 
 
+_WEEK_REPORT_RE = re.compile(
+    r'Week[_\s]+(\d+)[_\s]+(Participation|Challenge|In-Lab|Out-of-Lab)[_\s]+(Activities|Labs)',
+    re.IGNORECASE,
+)
+
+_ASSIGNMENT_TYPE_MAP = {
+    'Participation Activities': 'PA',
+    'Challenge Activities': 'CA',
+    'In-Lab Labs': 'IL',
+    'Out-of-Lab Labs': 'OL',
+}
+
+
 def parse_assignment_filename_short(filename):
     """Parse assignment name from zyBooks filename, returning abbreviated form.
     e.g. 'Week_3_Participation_Activities_report.csv' -> 'W3 PA'
     """
     stem = Path(filename).stem
 
-    match = re.search(
-        r'Week[_\s]+(\d+)[_\s]+(Participation|Challenge|In-Lab|Out-of-Lab)[_\s]+(Activities|Labs)',
-        stem, re.IGNORECASE,
-    )
+    match = _WEEK_REPORT_RE.search(stem)
 
     if match:
         week_num = match.group(1)
         assignment_type = match.group(2).strip()
         assignment_kind = match.group(3).strip()
 
-        type_map = {
-            'Participation Activities': 'PA',
-            'Challenge Activities': 'CA',
-            'In-Lab Labs': 'IL',
-            'Out-of-Lab Labs': 'OL',
-        }
-
-        abbrev_type = type_map.get(f"{assignment_type} {assignment_kind}")
+        abbrev_type = _ASSIGNMENT_TYPE_MAP.get(f"{assignment_type} {assignment_kind}")
         if abbrev_type:
             return f"W{week_num} {abbrev_type}"
 
@@ -59,6 +67,8 @@ def parse_assignment_filename_short(filename):
 
 _KNOWN_TYPES = {'PA', 'CA', 'OL', 'IL'}
 
+_WEEK_STEM_RE = re.compile(r'^W?(\d+)$', re.IGNORECASE)
+
 
 def assignment_name_from_path(filepath):
     """
@@ -76,7 +86,7 @@ def assignment_name_from_path(filepath):
     # Try directory-based convention
     dir_type = p.parent.name.upper()
     if dir_type in _KNOWN_TYPES:
-        m = re.match(r'^W?(\d+)$', p.stem, re.IGNORECASE)
+        m = _WEEK_STEM_RE.match(p.stem)
         if m:
             return f"W{m.group(1)} {dir_type}"
 
@@ -102,6 +112,57 @@ def _parse_due_date_str(s):
     return dt.tz_convert('UTC')
 
 
+# zyBooks score dates look like "2026-01-14 10:35 PM EST" / "... EDT"
+_TZ_ABBREV_RE = re.compile(r'\b([A-Z]{2,4})$')
+_TZ_SUFFIX_RE = re.compile(r'\s+[A-Z]{2,4}$')
+_SCORE_DATE_FORMAT = '%Y-%m-%d %I:%M %p'
+
+
+def _parse_score_date_str(s):
+    """
+    Parse a zyBooks score date to a UTC Timestamp.  The trailing timezone
+    abbreviation is stripped and used only to resolve DST ambiguity.
+    """
+    tz_match = _TZ_ABBREV_RE.search(s)
+    is_dst = tz_match.group(1).endswith('DT') if tz_match else False
+    dt = pd.to_datetime(_TZ_SUFFIX_RE.sub('', s))
+    dt = dt.tz_localize(_LOCAL_TZ, ambiguous=is_dst, nonexistent='shift_forward')
+    return dt.tz_convert('UTC')
+
+
+def _parse_score_dates(date_strs):
+    """
+    Vectorized _parse_score_date_str for a list of stripped strings.
+
+    The whole column is parsed in one pass with the zyBooks format; only
+    strings that don't fit it go through the general per-cell parser.
+    Returns a list of UTC Timestamps, with None for empty or unparseable
+    strings.
+    """
+    strs = pd.Series(date_strs, dtype=object)
+    is_dst = strs.str.extract(_TZ_ABBREV_RE, expand=False).str.endswith('DT')
+    parsed = pd.to_datetime(
+        strs.str.replace(_TZ_SUFFIX_RE, '', regex=True),
+        format=_SCORE_DATE_FORMAT, errors='coerce',
+    )
+    parsed = parsed.dt.tz_localize(
+        _LOCAL_TZ, ambiguous=is_dst.fillna(False).astype(bool).to_numpy(),
+        nonexistent='shift_forward',
+    ).dt.tz_convert('UTC')
+
+    result = []
+    for s, dt in zip(date_strs, parsed.tolist()):
+        if pd.isna(dt):
+            dt = None
+            if s:
+                try:
+                    dt = _parse_score_date_str(s)
+                except Exception:
+                    pass
+        result.append(dt)
+    return result
+
+
 def load_due_dates_csv(path):
     """
     Load due dates from a CSV with one row per week.
@@ -161,24 +222,16 @@ def _load_deadlined_scores(filepath):
     id_col = find_student_id_column(df)
     email_col = find_email_column(df)
 
-    id_scores = {}
-    username_scores = {}
-    for _, row in df.iterrows():
-        val = row.get(score_col)
-        if pd.isna(val) or str(val).strip() == '':
-            continue
-        try:
-            score = float(val)
-        except (TypeError, ValueError):
-            continue
-        if id_col:
-            sid = normalize_student_id(row[id_col])
-            if sid:
-                id_scores[sid] = max(id_scores.get(sid, 0.0), score)
-        if email_col:
-            username = extract_username_from_email(row[email_col])
-            if username:
-                username_scores[username] = max(username_scores.get(username, 0.0), score)
+    scores, scored = parse_score_column(df[score_col])
+
+    def best_by(keys):
+        # Highest score per key in first-seen order, floored at 0.0
+        keep = scored & keys.astype(bool)
+        best = scores[keep].groupby(keys[keep].to_numpy(), sort=False).max()
+        return best.fillna(0.0).clip(lower=0.0).to_dict()
+
+    id_scores = best_by(normalize_student_id_series(df[id_col])) if id_col else {}
+    username_scores = best_by(extract_usernames_series(df[email_col])) if email_col else {}
     return id_scores, username_scores
 
 
@@ -189,7 +242,6 @@ def _build_lab_section_map(lecture_dfs):
     Returns:
         (username_map, id_map) where values are section strings like '60', '61'
     """
-    from .common import resolve_column
     from .merge import find_username_column
 
     username_map = {}
@@ -201,27 +253,33 @@ def _build_lab_section_map(lecture_dfs):
         except ValueError:
             continue
 
+        labs = df[lab_col]
+        sections = labs[labs.notna()].astype(str).str.strip()
+        sections = sections[(sections != '') & (sections.str.lower() != 'nan')]
+        if sections.empty:
+            continue
+
         un_col = find_username_column(df)
         em_col = find_email_column(df)
         id_col = find_student_id_column(df)
 
-        for _, row in df.iterrows():
-            section = str(row[lab_col]).strip() if pd.notna(row[lab_col]) else ''
-            if not section or section.lower() == 'nan':
-                continue
-
-            username = None
-            if un_col and not pd.isna(row.get(un_col)):
-                username = str(row[un_col]).strip().lower()
-            elif em_col:
-                username = extract_username_from_email(row[em_col])
-            if username:
-                username_map[username] = section
+        # Username column where set, else the email's username
+        if em_col:
+            usernames = extract_usernames_series(df.loc[sections.index, em_col])
+        else:
+            usernames = pd.Series([None] * len(sections), index=sections.index, dtype=object)
+        if un_col:
+            present = df.loc[sections.index, un_col].notna()
+            usernames[present] = (
+                df.loc[present[present].index, un_col].astype(str).str.strip().str.lower()
+            )
+        has_username = usernames.astype(bool)
+        username_map.update(zip(usernames[has_username], sections[has_username]))
 
-            if id_col:
-                sid = normalize_student_id(row[id_col])
-                if sid:
-                    id_map[sid] = section
+        if id_col:
+            ids = normalize_student_id_series(df.loc[sections.index, id_col])
+            has_id = ids.astype(bool)
+            id_map.update(zip(ids[has_id], sections[has_id]))
 
     return username_map, id_map
 
@@ -293,57 +351,84 @@ def _apply_late_penalties(df, due_dt, days_grace, penalty, assignment_name, verb
 
     df[score_col] = df[score_col].astype(object)
 
+    # Resolve every per-student lookup as a column up front: normalized ID,
+    # email username, lab section (by username, then by ID), the section's
+    # IL due date, the deadlined-report score, and penalty exemption
+    no_key = pd.Series([None] * len(df), index=df.index, dtype=object)
+    sids = normalize_student_id_series(df[id_col]) if id_col else no_key
+    usernames = extract_usernames_series(df[email_col]) if email_col else no_key
+    sections = usernames.map(lab_section_map or {})
+    sections = sections.where(sections.notna(), sids.map(id_section_map or {}))
+    sections = sections.astype(object).where(sections.notna(), None)
+    section_dues = sections.map(section_due_dates or {}).astype(object)
+    section_dues = section_dues.where(section_dues.notna(), None)
+    if deadlined_scores is not None:
+        id_sc, un_sc = deadlined_scores
+        dl_scores = sids.map(id_sc)
+        if email_col:
+            dl_scores = dl_scores.where(dl_scores.notna(), usernames.map(un_sc))
+        dl_vals = dl_scores.fillna(0.0).astype(float).tolist()
+    exempt_flags = (
+        sids.isin(list(no_penalty_ids)) & sids.astype(bool) if no_penalty_ids
+        else pd.Series(False, index=df.index)
+    ).to_numpy()
+    sids = sids.to_numpy()
+    sections = sections.to_numpy()
+    section_dues = section_dues.to_numpy()
+
+    # Pull the remaining row inputs out as plain column lists; score changes
+    # are collected by position and written back in one block after the loop
+    first_col, last_col = find_name_columns(df)
+    first_names = [str(v) if pd.notna(v) else '' for v in df[first_col].tolist()] if first_col else [''] * len(df)
+    last_names = [str(v) if pd.notna(v) else '' for v in df[last_col].tolist()] if last_col else [''] * len(df)
+    emails = df[email_col].tolist() if email_col else [''] * len(df)
+    score_date_strs = [str(v).strip() if pd.notna(v) else '' for v in df[score_date_col].tolist()]
+    sub_dts = _parse_score_dates(score_date_strs)
+    original_scores = df[score_col].tolist()
+    new_scores = {}
+
     late_records = []
-    audit_records = []
+    # Rows without a score date only get a 'no submission' audit entry; fill
+    # those slots up front and run the loop over the submitted rows alone.
+    # Each row contributes at most one audit record, kept in row order.
+    audit_slots = [None] * len(df)
+    submitted = []
+    for pos, score_date_str in enumerate(score_date_strs):
+        if score_date_str:
+            submitted.append(pos)
+            continue
+        audit_slots[pos] = {
+            'Last Name': last_names[pos],
+            'First Name': first_names[pos],
+            'Student ID': sids[pos] or '',
+            'Lab Section': '',
+            'School Email': emails[pos],
+            'Score Date (local)': '',
+            'Due Date (local)': '',
+            'Delta': '',
+            'Status': 'no submission',
+            'Penalty Factor': '',
+            'Original Score': None,
+            'Applied Score': None,
+        }
+
     n_late = 0
     n_penalized = 0
     n_no_section = 0
 
-    for idx, row in df.iterrows():
-        first_name = ''
-        last_name = ''
-        for col in row.index:
-            cl = col.lower()
-            if 'first' in cl and 'name' in cl:
-                first_name = str(row[col]) if pd.notna(row[col]) else ''
-            elif 'last' in cl and 'name' in cl:
-                last_name = str(row[col]) if pd.notna(row[col]) else ''
-
-        student_sid = normalize_student_id(row[id_col]) if id_col else None
-        score_date_str = str(row[score_date_col]).strip() if pd.notna(row[score_date_col]) else ''
-        if not score_date_str:
-            audit_records.append({
-                'Last Name': last_name,
-                'First Name': first_name,
-                'Student ID': student_sid or '',
-                'Lab Section': '',
-                'School Email': row[email_col] if email_col else '',
-                'Score Date (local)': '',
-                'Due Date (local)': '',
-                'Delta': '',
-                'Status': 'no submission',
-                'Penalty Factor': '',
-                'Original Score': None,
-                'Applied Score': None,
-            })
-            continue
-
-        try:
-            # zyBooks format: "2026-01-14 10:35 PM EST" / "... EDT"
-            # Strip the abbreviation and localize; use it to resolve DST ambiguity.
-            tz_match = re.search(r'\b([A-Z]{2,4})$', score_date_str.strip())
-            is_dst = tz_match.group(1).endswith('DT') if tz_match else False
-            clean = re.sub(r'\s+[A-Z]{2,4}$', '', score_date_str.strip())
-            sub_dt = pd.to_datetime(clean)
-            sub_dt = sub_dt.tz_localize(_LOCAL_TZ, ambiguous=is_dst, nonexistent='shift_forward')
-            sub_dt = sub_dt.tz_convert('UTC')
-        except Exception:
-            audit_records.append({
+    for pos in submitted:
+        first_name = first_names[pos]
+        last_name = last_names[pos]
+        student_sid = sids[pos]
+        score_date_str = score_date_strs[pos]
+        sub_dt = sub_dts[pos]
+        if sub_dt is None:
+            audit_slots[pos] = {
                 'Last Name': last_name,
                 'First Name': first_name,
                 'Student ID': student_sid or '',
                 'Lab Section': '',
-                'School Email': row[email_col] if email_col else '',
+                'School Email': emails[pos],
                 'Score Date (local)': score_date_str,
                 'Due Date (local)': '',
                 'Delta': '',
@@ -351,26 +436,22 @@ def _apply_late_penalties(df, due_dt, days_grace, penalty, assignment_name, verb
                 'Penalty Factor': '',
                 'Original Score': None,
                 'Applied Score': None,
-            })
+            }
             continue
 
         sub_dt_local = sub_dt.tz_convert(_LOCAL_TZ)
 
         # Resolve effective due date
+        section = sections[pos]
         if il_mode:
-            username = extract_username_from_email(row[email_col]) if email_col else None
-            section = (
-                (lab_section_map or {}).get(username) or
-                (id_section_map or {}).get(student_sid)
-            )
             if not section:
                 n_no_section += 1
-                audit_records.append({
+                audit_slots[pos] = {
                     'Last Name': last_name,
                     'First Name': first_name,
                     'Student ID': student_sid or '',
                     'Lab Section': section or '',
-                    'School Email': row[email_col] if email_col else '',
+                    'School Email': emails[pos],
                     'Score Date (local)': sub_dt_local.isoformat(timespec='minutes'),
                     'Due Date (local)': '',
                     'Delta': '',
@@ -378,34 +459,25 @@ def _apply_late_penalties(df, due_dt, days_grace, penalty, assignment_name, verb
                     'Penalty Factor': '',
                     'Original Score': None,
                     'Applied Score': None,
-                })
+                }
                 continue
-            effective_due_dt = (section_due_dates or {}).get(section)
+            effective_due_dt = section_dues[pos]
             if effective_due_dt is None:
                 continue
         else:
             effective_due_dt = due_dt
-            username = extract_username_from_email(row[email_col]) if email_col else None
-            section = (
-                (lab_section_map or {}).get(username) or
-                (id_section_map or {}).get(student_sid)
-            ) or None
 
         due_dt_local = effective_due_dt.tz_convert(_LOCAL_TZ)
         delta = (sub_dt - effective_due_dt).total_seconds()
-        original_score = row[score_col]
+        original_score = original_scores[pos]
         penalized_score = original_score  # default; overwritten if penalty applied
 
-        exempt = no_penalty_ids and student_sid and student_sid in no_penalty_ids
+        exempt = exempt_flags[pos]
 
         # Determine lateness and final score
         if deadlined_scores is not None:
             # Two-report mode: final = max(deadlined_score, lifted_score × (1−penalty))
-            id_sc, un_sc = deadlined_scores
-            dl_score = id_sc.get(student_sid) if student_sid else None
-            if dl_score is None and email_col:
-                dl_score = un_sc.get(extract_username_from_email(row[email_col]))
-            dl_val = float(dl_score) if dl_score is not None else 0.0
+            dl_val = dl_vals[pos]
             try:
                 lifted_val = float(original_score)
             except (TypeError, ValueError):
@@ -429,7 +501,7 @@ def _apply_late_penalties(df, due_dt, days_grace, penalty, assignment_name, verb
             if deadlined_scores is not None:
                 factor = factor_two
                 penalized_score = final_val  # = penalized_val (since penalized > dl)
-                df.at[idx, score_col] = final_val
+                new_scores[pos] = final_val
                 n_penalized += 1
                 status = 'exempt' if exempt else 'late'
             elif exempt:
@@ -439,7 +511,7 @@ def _apply_late_penalties(df, due_dt, days_grace, penalty, assignment_name, verb
             elif not pd.isna(original_score):
                 factor = _late_penalty_factor(delta, days_grace, penalty, hours_grace)
                 penalized_score = original_score * factor
-                df.at[idx, score_col] = penalized_score
+                new_scores[pos] = penalized_score
                 if factor < 1.0:
                     n_penalized += 1
                 within_grace = delta <= days_grace * 86400 + hours_grace * 3600
@@ -456,7 +528,7 @@ def _apply_late_penalties(df, due_dt, days_grace, penalty, assignment_name, verb
                 'First Name': first_name,
                 'Student ID': student_sid or '',
                 'Lab Section': section or '',
-                'School Email': row[email_col] if email_col else '',
+                'School Email': emails[pos],
                 'Score Date': score_date_str,
                 'How Late': how_late,
                 'Original Score': round(float(original_score), 4) if not pd.isna(original_score) else '',
@@ -471,7 +543,7 @@ def _apply_late_penalties(df, due_dt, days_grace, penalty, assignment_name, verb
             if deadlined_scores is not None and dl_val > 0 and not pd.isna(original_score):
                 try:
                     if float(original_score) < dl_val - 0.01:
-                        df.at[idx, score_col] = dl_val
+                        new_scores[pos] = dl_val
                 except (TypeError, ValueError):
                     pass
 
@@ -479,8 +551,8 @@ def _apply_late_penalties(df, due_dt, days_grace, penalty, assignment_name, verb
         audit_rec = {
             'Last Name': last_name,
             'First Name': first_name,
-            'Student ID': normalize_student_id(row[id_col]) if id_col else '',
-            'School Email': row[email_col] if email_col else '',
+            'Student ID': student_sid if id_col else '',
+            'School Email': emails[pos],
             'Score Date (local)': sub_dt_local.strftime('%Y-%m-%d %H:%M'),
             'Due Date (local)': due_dt_local.strftime('%Y-%m-%d %H:%M'),
             'Delta': fmt_late(delta) if delta > 0 else f"-{fmt_late(-delta)}",
@@ -490,7 +562,12 @@ def _apply_late_penalties(df, due_dt, days_grace, penalty, assignment_name, verb
             'Applied Score': round(float(penalized_for_rec), 4) if not pd.isna(penalized_for_rec) else None,
         }
         audit_rec['Lab Section'] = section or ''
-        audit_records.append(audit_rec)
+        audit_slots[pos] = audit_rec
+
+    audit_records = [rec for rec in audit_slots if rec is not None]
+
+    if new_scores:
+        df.iloc[list(new_scores), df.columns.get_loc(score_col)] = list(new_scores.values())
 
     if verbose:
         print(f"   Late: {n_late} student(s), penalized: {n_penalized}")
@@ -565,18 +642,18 @@ def run_revert(pattern, lecture_files, original_files, quiet=False, weights_csv=
 
         # Build original student-ID -> value map
         if work_id_col and orig_id_col:
-            orig_map = {
-                normalize_student_id(row[orig_id_col]): row[orig_col]
-                for _, row in orig_df.iterrows()
-                if pd.notna(row[orig_id_col])
-            }
+            orig_sids = normalize_student_id_series(orig_df[orig_id_col])
+            present = orig_sids.notna()
+            orig_map = pd.Series(
+                orig_df[orig_col].astype(object).values[present.values],
+                index=orig_sids[present].values,
+            )
+            orig_map = orig_map[~orig_map.index.duplicated(keep='last')]
+            work_sids = normalize_student_id_series(work_df[work_id_col])
+            hit = work_sids.isin(orig_map.index) & (work_sids != '')
             work_df[work_col] = work_df[work_col].astype(object)
-            matched = 0
-            for idx, row in work_df.iterrows():
-                sid = normalize_student_id(row[work_id_col])
-                if sid and sid in orig_map:
-                    work_df.at[idx, work_col] = orig_map[sid]
-                    matched += 1
+            work_df.loc[hit, work_col] = work_sids[hit].map(orig_map)
+            matched = int(hit.sum())
             if verbose:
                 print(f"      Matched {matched}/{len(work_df)} student(s) by ID")
         else:
@@ -587,7 +664,7 @@ def run_revert(pattern, lecture_files, original_files, quiet=False, weights_csv=
             work_df[work_col] = orig_df[orig_col].values
 
         recompute_averages(work_df, weights=load_weights_csv(weights_csv) if weights_csv else None)
-        work_df.to_csv(lp, index=False, encoding='utf-8-sig', quoting=csv.QUOTE_ALL)
+        write_gradebook_csv(work_df, lp)
         if verbose:
             print(f"      Written: {lp}")
         reverted += 1
@@ -677,6 +754,10 @@ def run_revert(pattern, lecture_files, original_files, quiet=False, weights_csv=
     print("\nDone!")
 
 
+_COMPONENT_COL_RE = re.compile(r'^\d+\.\d+')
+_MAX_PTS_RE = re.compile(r'\((\d+(?:\.\d+)?)\)\s*$')
+
+
 def _find_component_columns(df):
     """
     Find component score columns in a zyBooks report DataFrame.
@@ -690,9 +771,9 @@ def _find_component_columns(df):
     """
     result = []
     for col in df.columns:
-        if not re.match(r'^\d+\.\d+', col.strip()):
+        if not _COMPONENT_COL_RE.match(col.strip()):
             continue
-        m = re.search(r'\((\d+(?:\.\d+)?)\)\s*$', col.strip())
+        m = _MAX_PTS_RE.search(col.strip())
         if m:
             result.append((col, float(m.group(1))))
     return result
@@ -706,6 +787,8 @@ def _apply_best_one_of(df, verbose=True):
     set 'Percent score' to the highest value.  Students with no valid component
     scores retain their original 'Percent score' value.
     """
+    import numpy as np
+
     score_col = next((c for c in df.columns if 'percent score' in c.lower()), None)
     if not score_col:
         if verbose:
@@ -722,29 +805,32 @@ def _apply_best_one_of(df, verbose=True):
         print(f"   best-one-of: {len(components)} component(s): "
               + ", ".join(c for c, _ in components))
 
+    # Fold the components left to right, as a running max over each row
+    best = np.full(len(df), np.nan)
+    has_best = np.zeros(len(df), dtype=bool)
+    for col, _max_pts in components:
+        numbers, counted = parse_score_column(df[col])
+        numbers = numbers.to_numpy()
+        counted = counted.to_numpy()
+        take = counted & (~has_best | (numbers > best))
+        best = np.where(take, numbers, best)
+        has_best |= counted
+
     df[score_col] = df[score_col].astype(object)
-    replaced = 0
-    for idx, row in df.iterrows():
-        best = None
-        for col, _max_pts in components:
-            val = row.get(col, '')
-            if pd.isna(val) or str(val).strip() == '':
-                continue
-            try:
-                score = float(val)
-                if best is None or score > best:
-                    best = score
-            except ValueError:
-                pass
-        if best is not None:
-            df.at[idx, score_col] = best
-            replaced += 1
+    replaced = int(has_best.sum())
+    if replaced:
+        df.loc[df.index[has_best], score_col] = best[has_best].tolist()
 
     if verbose:
         print(f"   best-one-of: replaced {replaced}/{len(df)} student score(s)")
     return df
 
 
+def _list_csvs(directory):
+    """Sorted CSV files directly inside *directory*."""
+    return sorted(p for p in directory.iterdir() if p.suffix == '.csv' and p.is_file())
+
+
 def run_assignment(deadline_input, lecture_files=None, output_dir='.',
                    quiet=False, due_dates_csv=None, days_grace=0, hours_grace=0,
                    penalty=0.2, date_audit=False, force=False,
@@ -809,6 +895,10 @@ def run_assignment(deadline_input, lecture_files=None, output_dir='.',
     # Derive assignment name(s) from the deadlined file (standard zyBooks filename);
     # use process_path (lifted or same) for the actual data to load.
     name_source = deadline_path if deadlined_input else process_path
+    deadlined_names = (
+        {p.name for p in _list_csvs(deadline_path)}
+        if deadlined_input and deadline_path.is_dir() else set()
+    )
 
     if process_path.is_file():
         derived = assignment_name_from_path(name_source)
@@ -820,7 +910,7 @@ def run_assignment(deadline_input, lecture_files=None, output_dir='.',
     else:
         if name:
             print(f"WARNING: --name is ignored when processing a directory")
-        csvs = sorted(process_path.glob('*.csv'))
+        csvs = _list_csvs(process_path)
         if not csvs:
             print(f"\nERROR: No CSV files found in: {process_path}")
             sys.exit(1)
@@ -830,7 +920,7 @@ def run_assignment(deadline_input, lecture_files=None, output_dir='.',
         for f in csvs:
             if name_source_dir:
                 dl_match = name_source_dir / f.name
-                aname = assignment_name_from_path(dl_match if dl_match.exists() else f)
+                aname = assignment_name_from_path(dl_match if f.name in deadlined_names else f)
             else:
                 aname = assignment_name_from_path(f)
             work_items.append((f, aname))
@@ -854,7 +944,7 @@ def run_assignment(deadline_input, lecture_files=None, output_dir='.',
             # Directory: match deadlined files to lifted files by filename
             for assignment_file, aname in work_items:
                 dl_file = deadline_path / assignment_file.name
-                if dl_file.exists():
+                if dl_file.name in deadlined_names:
                     try:
                         deadlined_scores_map[aname] = _load_deadlined_scores(dl_file)
                     except ValueError as e:
@@ -888,12 +978,17 @@ def run_assignment(deadline_input, lecture_files=None, output_dir='.',
         if no_penalty_ids else None
     )
 
+    # Index IL due dates by week once: week -> {section: due_dt}
+    il_due_dates = {}
+    for (w, t), dt in due_dates.items():
+        if t.startswith('IL'):
+            il_due_dates.setdefault(w, {})[t[2:]] = dt
+
     # Build lab-section maps if IL due dates are present
     lab_section_map = {}
     id_section_map = {}
     if due_dates and lecture_dfs:
-        has_il = any(t.startswith('IL') for (_, t) in due_dates)
-        if has_il:
+        if il_due_dates:
             lab_section_map, id_section_map = _build_lab_section_map(lecture_dfs)
             if verbose:
                 print(f"Lab sections loaded: {len(lab_section_map)} student(s) with assigned sections")
@@ -902,11 +997,19 @@ def run_assignment(deadline_input, lecture_files=None, output_dir='.',
     all_audit_records = {}  # assignment_name -> list of audit records
     processed = []  # list of (assignment_name, df)
 
-    for assignment_file, assignment_name in work_items:
+    # Read the reports concurrently (CSV parsing releases the GIL); penalties
+    # are still applied one assignment at a time, in order
+    with ThreadPoolExecutor() as pool:
+        pending_reads = [
+            pool.submit(read_csv_with_trailing_comma_fix, assignment_file)
+            for assignment_file, _ in work_items
+        ]
+
+    for (assignment_file, assignment_name), pending in zip(work_items, pending_reads):
         try:
             if verbose:
                 print(f"\nProcessing: {assignment_name}  ({assignment_file.name})")
-            df = read_csv_with_trailing_comma_fix(assignment_file)
+            df = pending.result()
             if verbose:
                 print(f"   Students: {len(df)}")
 
@@ -919,11 +1022,7 @@ def run_assignment(deadline_input, lecture_files=None, output_dir='.',
                     week_num = int(m.group(1))
                     atype = m.group(2)
                     if atype == 'IL':
-                        section_due_dates = {
-                            t[2:]: dt
-                            for (w, t), dt in due_dates.items()
-                            if w == week_num and t.startswith('IL')
-                        }
+                        section_due_dates = il_due_dates.get(week_num, {})
                         if not section_due_dates:
                             if verbose:
                                 print(f"   NOTE: No IL due dates found for W{week_num}")
@@ -1062,7 +1161,7 @@ def run_assignment(deadline_input, lecture_files=None, output_dir='.',
 
             orphaned = [
                 {'Username': u, 'Score': score_map[u]}
-                for u in set(score_map.keys()) - all_lecture_usernames
+                for u in sorted(set(score_map) - all_lecture_usernames)
                 if not _middle_name_matched(u, all_lecture_usernames)
             ]
             if orphaned:
@@ -1075,16 +1174,13 @@ def run_assignment(deadline_input, lecture_files=None, output_dir='.',
         out.mkdir(parents=True, exist_ok=True)
         print("\nWriting updated gradebooks:")
         for lecture_name, df in lecture_dfs.items():
-            unnamed_cols = [col for col in df.columns if 'Unnamed' in str(col)]
-            if unnamed_cols:
-                df = df.drop(columns=unnamed_cols)
             df = sort_assignment_columns(df)
             lec_id_col = find_student_id_column(df)
             if lec_id_col:
-                df[lec_id_col] = df[lec_id_col].apply(normalize_student_id)
+                df[lec_id_col] = normalize_student_id_series(df[lec_id_col])
             recompute_averages(df, weights=weights)
             output_path = out / lecture_paths[lecture_name].name
-            df.to_csv(output_path, index=False, encoding='utf-8-sig', quoting=csv.QUOTE_ALL)
+            write_gradebook_csv(df, output_path)
             print(f"   {output_path}")
 
     print("\nDone!")
@@ -459,11 +459,11 @@ Example:
 
 
 def main(argv=None):
-    from .common import load_aliases_csv  # noqa: F401 (used in dispatch below)
-
     parser = build_parser()
     args = parser.parse_args(argv)
 
+    from .common import load_aliases_csv  # noqa: F401 (used in dispatch below)
+
     def _make_audit_log(path_str):
         if not path_str:
             return None
@@ -1,44 +1,91 @@
 """Shared utilities for CSV parsing, student ID matching, and assignment name parsing."""
 
+import codecs
+import csv
 import io
+import mmap
 import re
+from functools import lru_cache
 from pathlib import Path
 
-import pandas as pd
 
+_TRAILING_COMMA_RE = re.compile(rb',(?=\r\n|\r|\n|\Z)')
+_UNNAMED_COL_RE = re.compile(r'Unnamed: \d+')
 
-def read_csv_with_trailing_comma_fix(filepath):
+
+def _is_named_column(col):
+    """usecols filter rejecting the 'Unnamed: N' columns pandas makes for empty headers."""
+    return not _UNNAMED_COL_RE.fullmatch(str(col))
+
+
+def read_csv_with_trailing_comma_fix(filepath, dtype=None):
     """
     Read a CSV file that may have trailing commas on each line.
 
+    The file is parsed directly by pandas; the empty 'Unnamed: N' columns that
+    trailing commas produce are filtered out by usecols, so they are never
+    materialized.  Files the tokenizer still rejects fall back to stripping
+    the trailing comma from each line of the memory-mapped file before parsing.
+
     Args:
         filepath: Path to CSV file
+        dtype: Optional {column: dtype} hints passed to pandas; columns the
+            file does not have are ignored
 
     Returns:
         pandas DataFrame
     """
-    with open(filepath, 'r', encoding='utf-8-sig') as f:
-        lines = f.readlines()
+    import pandas as pd
 
-    fixed_lines = []
-    for line in lines:
-        line = line.rstrip('\n\r')
-        if line.endswith(','):
-            line = line[:-1]
-        fixed_lines.append(line + '\n')
+    try:
+        return pd.read_csv(filepath, encoding='utf-8-sig', index_col=False,
+                           usecols=_is_named_column, dtype=dtype)
+    except pd.errors.ParserError:
+        # The parser only raises on non-empty files, so the map is never zero-length
+        with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            data = _TRAILING_COMMA_RE.sub(b'', mm)
+        return pd.read_csv(io.BytesIO(data), encoding='utf-8-sig', usecols=_is_named_column,
+                           dtype=dtype)
 
-    return pd.read_csv(io.StringIO(''.join(fixed_lines)))
 
+def write_gradebook_csv(df, path):
+    """
+    Write a gradebook DataFrame in the format the LMS import expects:
+    UTF-8 with BOM, every field quoted, no index column.
 
-def normalize_student_id(student_id):
+    The BOM is written once up front and pandas streams plain UTF-8 into a
+    large buffered binary handle.
     """
-    Normalize student ID to a string, handling float/int conversions.
+    with open(path, 'wb', buffering=1 << 20) as f:
+        f.write(codecs.BOM_UTF8)
+        df.to_csv(f, index=False, encoding='utf-8', quoting=csv.QUOTE_ALL)
 
-    Examples:
-        14788528.0 -> "14788528"
-        14788528 -> "14788528"
-        "14788528" -> "14788528"
+
+def wait_for_writes(writes):
+    """
+    Wait for background gradebook writes, in the order they were submitted.
+
+    Args:
+        writes: list of (output_path, Future) pairs
+
+    Returns:
+        Number of failed writes; each failure is reported with its path.
     """
+    failed = 0
+    for output_path, write in writes:
+        try:
+            write.result()
+        except Exception as e:
+            print(f"ERROR: Could not write {output_path}: {e}")
+            failed += 1
+    return failed
+
+
+@lru_cache(maxsize=4096, typed=True)
+def _normalize_student_id(student_id):
+    """Cached body of normalize_student_id; the same IDs recur in every report."""
+    import pandas as pd
+
     if pd.isna(student_id):
         return None
 
@@ -55,33 +102,125 @@ def normalize_student_id(student_id):
     return id_str
 
 
-def find_student_id_column(df):
-    """Find the student ID column in a DataFrame."""
-    patterns = [
-        'student id', 'studentid', 'student_id', 'sid',
-        'id', 'student number', 'student_number'
-    ]
+def normalize_student_id(student_id):
+    """
+    Normalize student ID to a string, handling float/int conversions.
 
-    for col in df.columns:
-        col_lower = col.lower().replace(' ', '').replace('_', '')
-        for pattern in patterns:
-            pattern_clean = pattern.replace(' ', '').replace('_', '')
-            if pattern_clean in col_lower or col_lower in pattern_clean:
+    Examples:
+        14788528.0 -> "14788528"
+        14788528 -> "14788528"
+        "14788528" -> "14788528"
+    """
+    try:
+        return _normalize_student_id(student_id)
+    except TypeError:  # unhashable input
+        return _normalize_student_id.__wrapped__(student_id)
+
+
+def normalize_student_id_series(ids):
+    """
+    Vectorized normalize_student_id for a whole column.
+
+    Returns an object Series of strings with None where the ID is missing,
+    matching normalize_student_id element for element.
+    """
+    import pandas as pd
+
+    s = ids.reset_index(drop=True)
+    present = s.notna()
+    id_strs = s[present].astype(str).str.strip()
+
+    dotted = id_strs.str.contains('.', regex=False)
+    if dotted.any():
+        values = pd.to_numeric(id_strs[dotted], errors='coerce')
+        integral = values[values % 1 == 0]
+        fits = integral.abs() < 2 ** 63
+        id_strs[integral.index[fits]] = integral[fits].astype('int64').astype(str)
+        id_strs[integral.index[~fits]] = [str(int(v)) for v in integral[~fits]]
+
+    out = pd.Series([None] * len(s), dtype=object)
+    out[present] = id_strs.astype(object)
+    out.index = ids.index
+    return out
+
+
+_ID_COLUMN_PATTERNS = ('studentid', 'sid', 'id', 'studentnumber')
+
+
+@lru_cache(maxsize=256)
+def _normalized_column_index(columns, strip):
+    """Map lowercased column names with *strip* characters removed to the first matching column."""
+    table = str.maketrans('', '', strip)
+    index = {}
+    for col in columns:
+        index.setdefault(col.lower().translate(table), col)
+    return index
+
+
+def normalized_column_index(df, strip=' _-'):
+    """
+    Return {normalized_name: column} for a DataFrame's columns.
+
+    Names are lowercased with the characters in *strip* removed; when two
+    columns normalize to the same name the first one wins.  The index is
+    cached per column tuple, so repeated lookups on the same frame are cheap.
+    """
+    return _normalized_column_index(tuple(df.columns), strip)
+
+
+@lru_cache(maxsize=256)
+def _student_id_column(columns):
+    """First column whose normalized name and an ID pattern contain one another."""
+    for col_clean, col in _normalized_column_index(columns, ' _').items():
+        for pattern in _ID_COLUMN_PATTERNS:
+            if pattern in col_clean or col_clean in pattern:
                 return col
 
     return None
 
 
+def find_student_id_column(df):
+    """Find the student ID column in a DataFrame."""
+    return _student_id_column(tuple(df.columns))
+
+
+@lru_cache(maxsize=4096, typed=True)
+def _extract_username_from_email(email):
+    """Cached body of extract_username_from_email."""
+    import pandas as pd
+
+    if pd.isna(email) or not email or '@' not in str(email):
+        return ''
+
+    return str(email).split('@')[0].strip().lower()
+
+
 def extract_username_from_email(email):
     """
     Extract username from email address.
 
     Example: "bk849@drexel.edu" -> "bk849"
     """
-    if pd.isna(email) or not email or '@' not in str(email):
-        return ''
+    try:
+        return _extract_username_from_email(email)
+    except TypeError:  # unhashable input
+        return _extract_username_from_email.__wrapped__(email)
 
-    return str(email).split('@')[0].strip().lower()
+
+def extract_usernames_series(emails):
+    """
+    Vectorized extract_username_from_email for a whole column.
+
+    Returns an object Series with '' wherever the email is missing or has no '@'.
+    """
+    import pandas as pd
+
+    strs = emails.astype(str)
+    has_at = emails.notna() & strs.str.contains('@', regex=False).fillna(False)
+    if not has_at.any():
+        return pd.Series([''] * len(emails), index=emails.index, dtype=object)
+    usernames = strs.str.split('@', n=1).str[0].str.strip().str.lower()
+    return usernames.where(has_at, '').astype(object)
 
 
 def find_email_column(df):
@@ -89,16 +228,7 @@ def find_email_column(df):
     Find the SCHOOL email column in a DataFrame.
     Only looks for "School email" specifically, not other email columns.
     """
-    patterns = ['school email', 'schoolemail', 'school_email']
-
-    for col in df.columns:
-        col_lower = col.lower().replace(' ', '').replace('_', '').replace('-', '')
-        for pattern in patterns:
-            pattern_clean = pattern.replace(' ', '').replace('_', '').replace('-', '')
-            if pattern_clean == col_lower:
-                return col
-
-    return None
+    return normalized_column_index(df).get('schoolemail')
 
 
 def find_name_columns(df):
@@ -119,6 +249,16 @@ def find_name_columns(df):
     return first_col, last_col
 
 
+def clean_name_series(names):
+    """Strip and lowercase a name column, with '' for missing values."""
+    import pandas as pd
+
+    present = names.notna()
+    cleaned = pd.Series([''] * len(names), index=names.index, dtype=object)
+    cleaned[present] = names[present].astype(str).str.strip().str.lower()
+    return cleaned
+
+
 def build_student_score_maps(student_df, score_col, aliases=None):
     """
     Build username, student-ID, and name lookup maps from a student DataFrame.
@@ -137,42 +277,54 @@ def build_student_score_maps(student_df, score_col, aliases=None):
     id_map = {}
     name_map = {}
 
+    if score_col not in student_df.columns:
+        return username_map, id_map, name_map
+
     email_col = find_email_column(student_df)
     id_col = find_student_id_column(student_df)
     first_col, last_col = find_name_columns(student_df)
 
-    for _, row in student_df.iterrows():
-        score = row.get(score_col)
-        if pd.isna(score):
-            continue
-
-        if email_col:
-            username = extract_username_from_email(row[email_col])
-            if username:
-                if aliases and username in aliases:
-                    username = aliases[username]
-                username_map[username] = score
-                # first.middle.last -> also register first.last and (last, first)
-                parts = username.split('.')
-                if len(parts) >= 3:
-                    short = f"{parts[0]}.{parts[-1]}"
-                    if short not in username_map:
-                        username_map[short] = score
-                    key = (parts[-1].lower(), parts[0].lower())
-                    if key not in name_map:
-                        name_map[key] = score
-
-        if id_col:
-            student_id = normalize_student_id(row[id_col])
-            if student_id:
-                id_map[student_id] = score
-
-        if first_col and last_col:
-            first = str(row[first_col]).strip().lower() if pd.notna(row[first_col]) else ''
-            last = str(row[last_col]).strip().lower() if pd.notna(row[last_col]) else ''
-            if first and last:
-                name_map[(last, first)] = score
-
+    rows = student_df[student_df[score_col].notna()]
+    scores = rows[score_col]
+
+    # Later rows win for full usernames, IDs, and real names; the first.last
+    # short forms and (last, first) keys derived from first.middle.last
+    # usernames only fill gaps, so the first row to produce one wins and any
+    # full username / real name overrides it.
+    derived_names = {}
+    if email_col:
+        usernames = extract_usernames_series(rows[email_col])
+        if aliases:
+            aliased = usernames.map(aliases)
+            usernames = aliased.where(aliased.notna(), usernames)
+        has_user = (usernames != '').to_numpy()
+        usernames = usernames[has_user]
+        user_scores = scores[has_user]
+
+        parts = usernames.str.split('.')
+        three_part = (parts.str.len() >= 3).to_numpy()
+        firsts = parts[three_part].str[0]
+        lasts = parts[three_part].str[-1]
+        short_scores = user_scores[three_part]
+        short_map = dict(zip((firsts + '.' + lasts)[::-1], short_scores[::-1]))
+        derived_names = dict(zip(zip(lasts.str.lower()[::-1], firsts.str.lower()[::-1]),
+                                 short_scores[::-1]))
+
+        username_map = {**short_map, **dict(zip(usernames, user_scores))}
+
+    if id_col:
+        ids = normalize_student_id_series(rows[id_col])
+        has_id = ids.astype(bool).to_numpy()
+        id_map = dict(zip(ids[has_id], scores[has_id]))
+
+    real_names = {}
+    if first_col and last_col:
+        firsts = clean_name_series(rows[first_col])
+        lasts = clean_name_series(rows[last_col])
+        has_name = ((firsts != '') & (lasts != '')).to_numpy()
+        real_names = dict(zip(zip(lasts[has_name], firsts[has_name]), scores[has_name]))
+
+    name_map = {**derived_names, **real_names}
     return username_map, id_map, name_map
 
 
@@ -237,6 +389,8 @@ def load_aliases_csv(path):
     Expected columns: zybooks_username, username  (student_id optional, for reference)
     Returns: {zybooks_username_lower: drexel_username_lower}
     """
+    import pandas as pd
+
     df = pd.read_csv(path, encoding='utf-8-sig')
     aliases = {}
     for _, row in df.iterrows():
@@ -247,17 +401,11 @@ def load_aliases_csv(path):
     return aliases
 
 
-def load_weights_csv(path):
-    """
-    Load per-assignment weights from a CSV structured like the due dates CSV.
-
-    Expected format:
-        Week column (any name containing 'week', or the first column)
-        Type columns: PA, CA, OL, IL (one per assignment type)
+@lru_cache(maxsize=8)
+def _load_weights_csv(path, mtime_ns):
+    """Parsed weights for *path*; keyed on mtime so an edited file is re-read."""
+    import pandas as pd
 
-    Returns:
-        dict mapping (week_int, type_str) -> float weight
-    """
     df = pd.read_csv(path)
     week_col = next((c for c in df.columns if 'week' in c.lower()), df.columns[0])
     result = {}
@@ -279,6 +427,45 @@ def load_weights_csv(path):
     return result
 
 
+def load_weights_csv(path):
+    """
+    Load per-assignment weights from a CSV structured like the due dates CSV.
+
+    Expected format:
+        Week column (any name containing 'week', or the first column)
+        Type columns: PA, CA, OL, IL (one per assignment type)
+
+    The parse is cached per (path, mtime), so commands that recompute
+    averages once per gradebook read the file only once.
+
+    Returns:
+        dict mapping (week_int, type_str) -> float weight
+    """
+    return dict(_load_weights_csv(str(path), Path(path).stat().st_mtime_ns))
+
+
+def parse_score_column(values):
+    """
+    Parse a score column the way float() reads each cell.
+
+    Returns:
+        (numbers, counted): float values, and a mask of the cells that hold a
+        number (blank or unparseable cells are not counted)
+    """
+    import pandas as pd
+
+    numbers = pd.to_numeric(values, errors='coerce').astype(float)
+    counted = numbers.notna()
+    # to_numeric gives up on a few spellings float() accepts ('nan', '1_000')
+    for idx in values.index[values.notna().to_numpy() & ~counted.to_numpy()]:
+        try:
+            numbers[idx] = float(values[idx])
+            counted[idx] = True
+        except (ValueError, TypeError):
+            pass
+    return numbers, counted
+
+
 def recompute_averages(df, weights=None):
     """
     Recompute XX AVG columns (and XX WAVG if weights provided) in-place.
@@ -290,6 +477,8 @@ def recompute_averages(df, weights=None):
     Types or target columns not present in the gradebook are silently skipped.
     Returns the (possibly modified) DataFrame.
     """
+    import pandas as pd
+
     TYPES = ['PA', 'CA', 'IL', 'OL']
 
     for atype in TYPES:
@@ -304,55 +493,68 @@ def recompute_averages(df, weights=None):
 
         col_names = [c for c, _ in week_cols]
 
-        # --- AVG ---
         avg_matches = [
             col for col in df.columns
             if re.match(rf'^{atype}\s+AVG\b', col.strip(), re.IGNORECASE)
         ]
+        wavg_matches = [
+            col for col in df.columns
+            if re.match(rf'^{atype}\s+WAVG\b', col.strip(), re.IGNORECASE)
+        ] if weights else []
+        if len(avg_matches) != 1 and len(wavg_matches) != 1:
+            continue
+
+        # Sums are accumulated column by column, in the same order as a
+        # per-row loop would add them, so the results are bit-for-bit equal
+        parsed = {col: parse_score_column(df[col]) for col in col_names}
+
+        # --- AVG ---
         if len(avg_matches) == 1:
             avg_col = avg_matches[0]
-            df[avg_col] = df[avg_col].astype(object)
-            for idx, row in df.iterrows():
-                scores = []
-                for col in col_names:
-                    val = row[col]
-                    if pd.isna(val) or str(val).strip() == '':
-                        continue
-                    try:
-                        scores.append(float(val))
-                    except (ValueError, TypeError):
-                        pass
-                df.at[idx, avg_col] = f"{sum(scores) / len(scores):.2f}" if scores else ''
+            total = pd.Series(0.0, index=df.index)
+            count = pd.Series(0, index=df.index)
+            for col in col_names:
+                values, counted = parsed[col]
+                total = total + values.where(counted, 0.0)
+                count = count + counted
+            df[avg_col] = pd.Series(
+                [f"{t / n:.2f}" if n else '' for t, n in zip(total, count)],
+                index=df.index, dtype=object,
+            )
 
         # --- WAVG ---
-        if weights:
-            wavg_matches = [
-                col for col in df.columns
-                if re.match(rf'^{atype}\s+WAVG\b', col.strip(), re.IGNORECASE)
-            ]
-            if len(wavg_matches) == 1:
-                wavg_col = wavg_matches[0]
-                df[wavg_col] = df[wavg_col].astype(object)
-                for idx, row in df.iterrows():
-                    wsum = 0.0
-                    wtotal = 0.0
-                    for col, week_num in week_cols:
-                        w = weights.get((week_num, atype))
-                        if w is None:
-                            continue
-                        val = row[col]
-                        if pd.isna(val) or str(val).strip() == '':
-                            continue
-                        try:
-                            wsum += w * float(val)
-                            wtotal += w
-                        except (ValueError, TypeError):
-                            pass
-                    df.at[idx, wavg_col] = f"{wsum / wtotal:.5f}" if wtotal > 0 else ''
+        if len(wavg_matches) == 1:
+            wavg_col = wavg_matches[0]
+            wsum = pd.Series(0.0, index=df.index)
+            wtotal = pd.Series(0.0, index=df.index)
+            for col, week_num in week_cols:
+                w = weights.get((week_num, atype))
+                if w is None:
+                    continue
+                values, counted = parsed[col]
+                wsum = wsum + (w * values).where(counted, 0.0)
+                wtotal = wtotal + pd.Series(w, index=df.index).where(counted, 0.0)
+            df[wavg_col] = pd.Series(
+                [f"{ws / wt:.5f}" if wt > 0 else '' for ws, wt in zip(wsum, wtotal)],
+                index=df.index, dtype=object,
+            )
 
     return df
 
 
+_WEEK_REPORT_RE = re.compile(
+    r'Week[_\s]+(\d+)[_\s]+(Participation|Challenge|In-Lab|Out-of-Lab)[_\s]+(Activities|Labs)',
+    re.IGNORECASE,
+)
+_SHORT_NAME_RE = re.compile(r'(W\d+)[_\s]+(PA|CA|IL|OL)', re.IGNORECASE)
+_ASSIGNMENT_TYPE_MAP = {
+    'Participation Activities': 'PA',
+    'Challenge Activities': 'CA',
+    'In-Lab Labs': 'IL',
+    'Out-of-Lab Labs': 'OL',
+}
+
+
 def parse_assignment_filename(filename):
     """
     Parse assignment name from zyBooks filename.
@@ -372,10 +574,7 @@ def parse_assignment_filename(filename):
     """
     stem = Path(filename).stem
 
-    match = re.search(
-        r'Week[_\s]+(\d+)[_\s]+(Participation|Challenge|In-Lab|Out-of-Lab)[_\s]+(Activities|Labs)',
-        stem, re.IGNORECASE,
-    )
+    match = _WEEK_REPORT_RE.search(stem)
 
     if match:
         week_num = match.group(1)
@@ -384,22 +583,15 @@ def parse_assignment_filename(filename):
 
         full_name = f"Week {week_num} {assignment_type} {assignment_kind}"
 
-        type_map = {
-            'Participation Activities': 'PA',
-            'Challenge Activities': 'CA',
-            'In-Lab Labs': 'IL',
-            'Out-of-Lab Labs': 'OL',
-        }
-
         assignment_combo = f"{assignment_type} {assignment_kind}"
-        abbrev_type = type_map.get(assignment_combo, None)
+        abbrev_type = _ASSIGNMENT_TYPE_MAP.get(assignment_combo, None)
 
         if abbrev_type:
             abbrev_name = f"W{week_num} {abbrev_type}"
             return full_name, abbrev_name
 
     # Try simplified format: WX_YZ_grades.csv
-    match = re.search(r'(W\d+)[_\s]+(PA|CA|IL|OL)', stem, re.IGNORECASE)
+    match = _SHORT_NAME_RE.search(stem)
     if match:
         abbrev_name = f"{match.group(1).upper()} {match.group(2).upper()}"
         full_name = abbrev_name
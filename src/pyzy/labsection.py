@@ -7,7 +7,6 @@ Lab section is parsed from the gradebook filename:
     sec_65_grades.csv    ->  IL65  (first 2+-digit number wins)
 """
 
-import csv
 import re
 import sys
 from pathlib import Path
@@ -22,6 +21,7 @@ from .common import (
     normalize_student_id,
     read_csv_with_trailing_comma_fix,
     resolve_column,
+    write_gradebook_csv,
 )
 from .merge import find_username_column
 
@@ -166,13 +166,11 @@ def run_assign_lab_section(lecture_files, lab_files, quiet=False):
             for lec_name, lec_df in lecture_dfs.items():
                 id_idx, username_idx, name_idx = lecture_indices[lec_name]
 
-                lec_idx = None
-                if lab_id and lab_id in id_idx:
-                    lec_idx = id_idx[lab_id]
-                elif lab_username and lab_username in username_idx:
-                    lec_idx = username_idx[lab_username]
-                elif lab_name and lab_name in name_idx:
-                    lec_idx = name_idx[lab_name]
+                lec_idx = id_idx.get(lab_id) if lab_id else None
+                if lec_idx is None and lab_username:
+                    lec_idx = username_idx.get(lab_username)
+                if lec_idx is None and lab_name:
+                    lec_idx = name_idx.get(lab_name)
 
                 if lec_idx is not None:
                     lec_df.at[lec_idx, lecture_cols[lec_name]] = section
@@ -202,5 +200,5 @@ def run_assign_lab_section(lecture_files, lab_files, quiet=False):
     print("\nWriting updated lecture gradebooks:")
     for lec_name, lec_df in lecture_dfs.items():
         lec_path = lecture_paths[lec_name]
-        lec_df.to_csv(lec_path, index=False, encoding='utf-8-sig', quoting=csv.QUOTE_ALL)
+        write_gradebook_csv(lec_df, lec_path)
         print(f"   {lec_path}")
@@ -3,7 +3,6 @@ Late penalty adjuster - reads *_late.csv reports produced by the assignment
 subcommand and lets the instructor interactively override per-student scores.
 """
 
-import csv
 import sys
 from pathlib import Path
 
@@ -15,9 +14,11 @@ from .common import (
     find_student_id_column,
     load_weights_csv,
     normalize_student_id,
+    normalize_student_id_series,
     read_csv_with_trailing_comma_fix,
     recompute_averages,
     resolve_column,
+    write_gradebook_csv,
 )
 from .merge import find_username_column, sort_assignment_columns
 
@@ -56,27 +57,32 @@ def _find_student_row(lecture_df, student_id, email):
     return None
 
 
-def _matches_student(row, query):
-    """Return True if the row matches the query (ID, username, or 'Last, First')."""
+def _student_matcher(query):
+    """
+    Return a row predicate that is True if the row matches the query
+    (ID, username, or 'Last, First').  The query is parsed once, up front.
+    """
     q = query.strip().lower()
-    sid = normalize_student_id(row.get('Student ID', ''))
-    if sid and sid == normalize_student_id(query):
-        return True
-    email = str(row.get('School Email', '')).strip().lower()
-    username = extract_username_from_email(email) if email else ''
-    if username and username == q:
-        return True
-    last = str(row.get('Last Name', '')).strip().lower()
-    first = str(row.get('First Name', '')).strip().lower()
+    query_sid = normalize_student_id(query)
     # "Last, First" or just "Last"
     if ',' in q:
-        parts = [p.strip() for p in q.split(',', 1)]
-        if parts[0] == last and (not parts[1] or parts[1] == first):
-            return True
+        q_last, q_first = [p.strip() for p in q.split(',', 1)]
     else:
-        if q == last:
+        q_last, q_first = q, ''
+
+    def matches(row):
+        sid = normalize_student_id(row.get('Student ID', ''))
+        if sid and sid == query_sid:
+            return True
+        email = str(row.get('School Email', '')).strip().lower()
+        username = extract_username_from_email(email) if email else ''
+        if username and username == q:
             return True
-    return False
+        last = str(row.get('Last Name', '')).strip().lower()
+        first = str(row.get('First Name', '')).strip().lower()
+        return q_last == last and (not q_first or q_first == first)
+
+    return matches
 
 
 def run_late_adjust(late_files, lecture_files, output_dir='.', weights_csv=None, student=None):
@@ -114,7 +120,7 @@ def run_late_adjust(late_files, lecture_files, output_dir='.', weights_csv=None,
         late_df = pd.read_csv(lp, encoding='utf-8-sig')
 
         if student:
-            late_df = late_df[late_df.apply(_matches_student, axis=1, query=student)]
+            late_df = late_df[late_df.apply(_student_matcher(student), axis=1)]
 
         if late_df.empty:
             continue
@@ -237,27 +243,28 @@ def run_late_adjust(late_files, lecture_files, output_dir='.', weights_csv=None,
         print("\nNo adjustments to apply.")
         return
 
-    # Apply all adjustments
+    # Apply all adjustments with one block write per (gradebook, column);
+    # a later adjustment to the same cell wins
+    pending = {}
     for lec_name, row_idx, col, score in adjustments:
+        pending.setdefault((lec_name, col), {})[row_idx] = f"{score:.2f}"
+    for (lec_name, col), cells in pending.items():
         df = lecture_dfs[lec_name]
         df[col] = df[col].astype(object)
-        df.at[row_idx, col] = f"{score:.2f}"
+        df.loc[list(cells), col] = list(cells.values())
 
     out = Path(output_dir)
     out.mkdir(parents=True, exist_ok=True)
 
     print("\nWriting updated gradebooks:")
     for lec_name, df in lecture_dfs.items():
-        unnamed = [c for c in df.columns if 'Unnamed' in str(c)]
-        if unnamed:
-            df = df.drop(columns=unnamed)
         df = sort_assignment_columns(df)
         id_col = find_student_id_column(df)
         if id_col:
-            df[id_col] = df[id_col].apply(normalize_student_id)
+            df[id_col] = normalize_student_id_series(df[id_col])
         recompute_averages(df, weights=load_weights_csv(weights_csv) if weights_csv else None)
         output_path = out / lecture_paths[lec_name].name
-        df.to_csv(output_path, index=False, encoding='utf-8-sig', quoting=csv.QUOTE_ALL)
+        write_gradebook_csv(df, output_path)
         print(f"   {output_path}")
 
     print("\nDone!")
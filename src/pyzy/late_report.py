@@ -112,7 +112,7 @@ def run_late_report(late_files=None, output_path='late_summary.csv', late_dir=No
     out_df.to_csv(out, index=False, encoding='utf-8-sig')
 
     print(f"Late report: {len(rows)} student(s)  x  {len(assignment_names)} assignment(s)")
+    late_counts = out_df[assignment_names].ne('on time').sum()
     for aname in assignment_names:
-        n_late = sum(1 for r in rows if r[aname] != 'on time')
-        print(f"   {aname}: {n_late} late")
+        print(f"   {aname}: {late_counts[aname]} late")
     print(f"\nWritten: {out}")
@@ -3,55 +3,108 @@ Grade Merger - transfers grades from per-assignment CSVs to lecture section CSVs
 based on student ID matching.
 """
 
-import csv
 import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-import pandas as pd
-
 from .common import (
     find_email_column,
     find_student_id_column,
-    extract_username_from_email,
+    extract_usernames_series,
     load_weights_csv,
-    normalize_student_id,
+    normalize_student_id_series,
+    normalized_column_index,
     parse_assignment_filename,
     read_csv_with_trailing_comma_fix,
     recompute_averages,
     resolve_column,
+    wait_for_writes,
+    write_gradebook_csv,
 )
 
+_ASSIGNMENT_TYPE_ORDER = {'PA': 0, 'CA': 1, 'IL': 2, 'OL': 3}
+_ASSIGNMENT_COL_RE = re.compile(r'\s*W(\d+)\s+(PA|CA|IL|OL)', re.IGNORECASE)
+
+# zyBooks report columns that are always text; parsing them as str skips
+# type inference.  Student ID is left to inference so that numeric IDs keep
+# normalizing the same way.
+_REPORT_TEXT_DTYPES = {
+    'Last name': str,
+    'First name': str,
+    'Primary email': str,
+    'School email': str,
+}
+
 
 def find_username_column(df):
     """Find the username column in a DataFrame."""
-    patterns = ['username', 'user name', 'user_name']
+    return normalized_column_index(df).get('username')
 
-    for col in df.columns:
-        col_lower = col.lower().replace(' ', '').replace('_', '').replace('-', '')
-        for pattern in patterns:
-            pattern_clean = pattern.replace(' ', '').replace('_', '').replace('-', '')
-            if pattern_clean == col_lower:
-                return col
 
-    return None
+def _row_lookup(keys):
+    """
+    Index lecture row labels by key, for _probe_lecture_rows.
+
+    Args:
+        keys: Series of normalized keys over the lecture rows (None or '' for
+            rows without one)
+
+    Returns:
+        int64 Series of row labels on a unique key index; a key that appears
+        on several rows keeps the last one
+    """
+    import pandas as pd
+
+    present = keys.astype(bool)
+    lookup = pd.Series(keys.index[present], index=pd.Index(keys[present], dtype=object), dtype='int64')
+    return lookup[~lookup.index.duplicated(keep='last')]
+
+
+def _probe_lecture_rows(lookup, keys):
+    """
+    Look up lecture row labels for a column of keys in one hash probe.
+
+    Args:
+        lookup: Series of lecture row labels indexed by key (see _row_lookup)
+        keys: Sequence of keys (None for rows without a key)
+
+    Returns:
+        int64 array of row labels, -1 where the key is not in *lookup*
+    """
+    import numpy as np
+
+    if lookup.empty:
+        return np.full(len(keys), -1, dtype=np.int64)
+    pos = lookup.index.get_indexer(keys)
+    return np.where(pos >= 0, lookup.to_numpy()[pos], -1)
 
 
-def sort_assignment_columns(df):
+def sort_assignment_columns(df, known=None):
     """
     Sort assignment columns by week number, then by assignment type.
     Order: W1 PA, W1 CA, W1 IL, W1 OL, W2 PA, W2 CA, W2 IL, W2 OL, etc.
+
+    Args:
+        df: Gradebook DataFrame
+        known: Optional {column: (week_num, type_order)} for columns whose
+            sort key is already known; other columns are parsed by regex.
     """
     assignment_cols = []
     non_assignment_cols = []
 
-    assignment_type_order = {'PA': 0, 'CA': 1, 'IL': 2, 'OL': 3}
+    known = known or {}
 
     for col in df.columns:
-        match = re.match(r'W(\d+)\s+(PA|CA|IL|OL)', col.strip(), re.IGNORECASE)
+        sort_key = known.get(col)
+        if sort_key:
+            assignment_cols.append((col, *sort_key))
+            continue
+        match = _ASSIGNMENT_COL_RE.match(col)
         if match:
             week_num = int(match.group(1))
             assignment_type = match.group(2).upper()
-            type_order = assignment_type_order.get(assignment_type, 99)
+            type_order = _ASSIGNMENT_TYPE_ORDER.get(assignment_type, 99)
             assignment_cols.append((col, week_num, type_order))
         else:
             non_assignment_cols.append(col)
@@ -75,6 +128,9 @@ def merge_grades_from_assignments(lecture_files, assignment_files, verbose=True)
     Returns:
         Dictionary with merge results and statistics
     """
+    import numpy as np
+    import pandas as pd
+
     results = {
         'updated_dataframes': {},
         'stats': {},
@@ -83,19 +139,57 @@ def merge_grades_from_assignments(lecture_files, assignment_files, verbose=True)
         'match_methods': {'by_id': 0, 'by_email': 0},
         'orphaned_rows': pd.DataFrame(),
         'failed_id_match_rows': pd.DataFrame(),
+        'new_columns': {},
     }
 
-    # Load all lecture sections
+    # Load all lecture sections; their columns do not change while merging,
+    # so the ID/email/username columns are looked up once per lecture here
     lecture_dfs = {}
+    lecture_cols = {}
+    lecture_maps = {}
     for filepath in lecture_files:
         lecture_name = Path(filepath).name
         df = read_csv_with_trailing_comma_fix(filepath)
         lecture_dfs[lecture_name] = df
+        lec_id_col, lec_email_col, lec_username_col = lecture_cols[lecture_name] = (
+            find_student_id_column(df),
+            find_email_column(df),
+            find_username_column(df),
+        )
+
+        # Index the lecture rows by student ID and by username; the probe
+        # index is built here once, not per assignment
+        if lec_id_col:
+            ids = normalize_student_id_series(df[lec_id_col])
+        else:
+            ids = pd.Series([None] * len(df), index=df.index, dtype=object)
+        if lec_email_col:
+            usernames = extract_usernames_series(df[lec_email_col])
+        else:
+            usernames = pd.Series([None] * len(df), index=df.index, dtype=object)
+        if lec_username_col:
+            present = df[lec_username_col].notna()
+            usernames[present] = df.loc[present, lec_username_col].astype(str).str.strip().str.lower()
+        lecture_maps[lecture_name] = (ids, _row_lookup(ids), _row_lookup(usernames))
 
         if verbose:
             print(f"\nLoaded lecture section: {lecture_name}")
             print(f"   Students: {len(df)}")
 
+    # Read the assignment reports concurrently (CSV parsing releases the
+    # GIL); they are still matched and merged one at a time, in order
+    readable_files = [
+        f for f in assignment_files if parse_assignment_filename(Path(f).name)[1]
+    ]
+    with ThreadPoolExecutor() as pool:
+        pending_reads = {
+            f: pool.submit(read_csv_with_trailing_comma_fix, f, _REPORT_TEXT_DTYPES)
+            for f in readable_files
+        }
+
+    orphaned_frames = []
+    failed_frames = []
+
     # Process each assignment file
     for assignment_file in assignment_files:
         assignment_name = Path(assignment_file).name
@@ -112,7 +206,13 @@ def merge_grades_from_assignments(lecture_files, assignment_files, verbose=True)
         if verbose:
             print(f"   Assignment: {full_name} -> {abbrev_name}")
 
-        assignment_df = read_csv_with_trailing_comma_fix(assignment_file)
+        week_part, type_part = abbrev_name.split()
+        abbrev_sort_key = (int(week_part[1:]), _ASSIGNMENT_TYPE_ORDER[type_part])
+
+        assignment_df = pending_reads[assignment_file].result()
+        if assignment_df.empty:
+            print(f"   WARNING: No student rows in assignment file, skipping")
+            continue
 
         assign_id_col = find_student_id_column(assignment_df)
         assign_email_col = find_email_column(assignment_df)
@@ -125,42 +225,54 @@ def merge_grades_from_assignments(lecture_files, assignment_files, verbose=True)
             print(f"   ERROR: Could not find Student ID column")
             continue
 
-        # Find grade column
+        # Find grade and date columns in one pass
         grade_col = None
+        due_date_col = None
+        score_date_col = None
         for col in assignment_df.columns:
-            if 'percent score' in col.lower():
+            col_lower = col.lower()
+            if grade_col is None and 'percent score' in col_lower:
                 grade_col = col
-                break
+            if 'due date' in col_lower:
+                due_date_col = col
+            elif 'score date' in col_lower:
+                score_date_col = col
 
         if not grade_col:
             print(f"   WARNING: Could not find grade column (Percent score)")
             continue
 
-        # Find date columns
-        due_date_col = None
-        score_date_col = None
-        for col in assignment_df.columns:
-            if 'due date' in col.lower():
-                due_date_col = col
-            elif 'score date' in col.lower():
-                score_date_col = col
-
         if verbose:
             print(f"   Grade column: '{grade_col}'")
             print(f"   Due date column: '{due_date_col}'")
             print(f"   Score date column: '{score_date_col}'")
 
-        all_assignment_students = set()
-        students_matched_this_assignment = set()
+        # Normalize the assignment's IDs and usernames once; every lecture
+        # section matches against the same keys
+        assign_ids = normalize_student_id_series(assignment_df[assign_id_col])
+        if assign_email_col:
+            assign_usernames = extract_usernames_series(assignment_df[assign_email_col])
+        else:
+            assign_usernames = pd.Series(None, index=assignment_df.index, dtype=object)
+        student_keys = pd.Series(
+            [sid or username for sid, username in zip(assign_ids, assign_usernames)],
+            index=assignment_df.index, dtype=object,
+        )
+        base_grades = assignment_df[grade_col]
+        has_grade = base_grades.notna() & (base_grades != '')
+
+        # Only lectures that get as far as matching put a student up for
+        # orphan reporting; if every lecture is skipped, nobody is orphaned
+        has_key = student_keys.astype(bool).to_numpy()
+        considered = np.zeros(len(assignment_df), dtype=bool)
+        matched_anywhere = np.zeros(len(assignment_df), dtype=bool)
 
         # Process each lecture section
         for lecture_name, lecture_df in lecture_dfs.items():
             if verbose:
                 print(f"\n   -> Merging into: {lecture_name}")
 
-            lec_id_col = find_student_id_column(lecture_df)
-            lec_email_col = find_email_column(lecture_df)
-            lec_username_col = find_username_column(lecture_df)
+            lec_id_col, lec_email_col, lec_username_col = lecture_cols[lecture_name]
 
             if verbose:
                 print(f"      Lecture ID column: '{lec_id_col}'")
@@ -171,24 +283,7 @@ def merge_grades_from_assignments(lecture_files, assignment_files, verbose=True)
                 print(f"      ERROR: Could not find matching columns")
                 continue
 
-            # Build student map
-            student_map = {}
-            username_map = {}
-
-            for idx, row in lecture_df.iterrows():
-                if lec_id_col:
-                    student_id = normalize_student_id(row[lec_id_col])
-                    if student_id:
-                        student_map[student_id] = idx
-
-                username = None
-                if lec_username_col and not pd.isna(row[lec_username_col]):
-                    username = str(row[lec_username_col]).strip().lower()
-                elif lec_email_col:
-                    username = extract_username_from_email(row[lec_email_col])
-
-                if username:
-                    username_map[username] = idx
+            lecture_ids, id_lookup, username_lookup = lecture_maps[lecture_name]
 
             try:
                 target_col = resolve_column(lecture_df, abbrev_name)
@@ -197,64 +292,53 @@ def merge_grades_from_assignments(lecture_files, assignment_files, verbose=True)
                 continue
             if verbose and target_col != abbrev_name:
                 print(f"      Resolved '{abbrev_name}' -> '{target_col}'")
-
-            grades_updated = 0
-            matched_by_id = 0
-            matched_by_email = 0
-            failed_id_matches = []
-
-            for _, assign_row in assignment_df.iterrows():
-                assign_student_id = normalize_student_id(assign_row[assign_id_col])
-                assign_username = None
-                if assign_email_col:
-                    assign_username = extract_username_from_email(assign_row[assign_email_col])
-
-                student_key = assign_student_id or assign_username
-                if student_key:
-                    all_assignment_students.add(student_key)
-
-                lecture_row_idx = None
-                match_method = None
-
-                if assign_student_id and assign_student_id in student_map:
-                    lecture_row_idx = student_map[assign_student_id]
-                    match_method = 'id'
-                    matched_by_id += 1
-                elif assign_username and assign_username in username_map:
-                    lecture_row_idx = username_map[assign_username]
-                    match_method = 'email'
-                    matched_by_email += 1
-
-                    if assign_student_id and lec_id_col:
-                        lec_student_id = normalize_student_id(
-                            lecture_df.at[lecture_row_idx, lec_id_col]
+            if target_col.strip().startswith(abbrev_name):
+                results['new_columns'][target_col] = abbrev_sort_key
+
+            # Match by ID first, then by username for rows whose ID is unknown
+            considered |= has_key
+            id_rows = _probe_lecture_rows(id_lookup, assign_ids)
+            username_rows = _probe_lecture_rows(username_lookup, assign_usernames)
+            by_id = id_rows >= 0
+            by_email = ~by_id & (username_rows >= 0)
+            matched = by_id | by_email
+            lecture_rows = np.where(by_id, id_rows, username_rows)
+
+            # Email matches whose lecture row carries a different student ID
+            failed_positions = []
+            if lec_id_col:
+                candidates = (by_email & assign_ids.astype(bool).to_numpy()).nonzero()[0]
+                assign_vals = assign_ids.to_numpy()[candidates]
+                lec_matched_ids = lecture_ids.loc[lecture_rows[candidates]]
+                lec_vals = lec_matched_ids.to_numpy()
+                mismatched = lec_matched_ids.astype(bool).to_numpy() & (assign_vals != lec_vals)
+                failed_positions = candidates[mismatched]
+                if verbose:
+                    for pos, assign_student_id, lec_student_id in zip(
+                        failed_positions, assign_vals[mismatched], lec_vals[mismatched]
+                    ):
+                        print(
+                            f"      WARNING: ID mismatch: {assign_usernames.iat[pos]} has ID "
+                            f"{assign_student_id} in assignment but {lec_student_id} in lecture"
                         )
-                        if lec_student_id and assign_student_id != lec_student_id:
-                            failed_id_matches.append(assign_row.to_dict())
-                            if verbose:
-                                print(
-                                    f"      WARNING: ID mismatch: {assign_username} has ID "
-                                    f"{assign_student_id} in assignment but {lec_student_id} in lecture"
-                                )
-
-                if lecture_row_idx is None:
-                    continue
 
-                students_matched_this_assignment.add(student_key)
-                results['matched_students'].add(student_key)
-                if match_method == 'id':
-                    results['match_methods']['by_id'] += 1
-                else:
-                    results['match_methods']['by_email'] += 1
-
-                base_grade = assign_row[grade_col]
-                if pd.isna(base_grade) or base_grade == '':
-                    continue
-
-                final_grade = base_grade
-
-                lecture_df.at[lecture_row_idx, target_col] = final_grade
-                grades_updated += 1
+            matched_anywhere |= matched
+            results['matched_students'].update(student_keys[matched])
+            matched_by_id = int(by_id.sum())
+            matched_by_email = int(by_email.sum())
+            results['match_methods']['by_id'] += matched_by_id
+            results['match_methods']['by_email'] += matched_by_email
+
+            # Write all grades at once; a lecture row matched more than once
+            # keeps the last assignment row's grade
+            to_write = matched & has_grade.to_numpy()
+            grades_updated = int(to_write.sum())
+            if grades_updated:
+                write_rows = lecture_rows[to_write]
+                keep = ~pd.Series(write_rows).duplicated(keep='last').to_numpy()
+                lecture_df.loc[write_rows[keep], target_col] = (
+                    base_grades.to_numpy()[to_write][keep]
+                )
 
             lecture_dfs[lecture_name] = lecture_df
 
@@ -274,35 +358,29 @@ def merge_grades_from_assignments(lecture_files, assignment_files, verbose=True)
                 print(f"      Grades updated: {grades_updated}")
                 print(f"      Matched: {matched_by_id} by ID, {matched_by_email} by email")
 
-            if failed_id_matches:
-                failed_df = pd.DataFrame(failed_id_matches)
-                results['failed_id_match_rows'] = pd.concat(
-                    [results['failed_id_match_rows'], failed_df], ignore_index=True
-                )
+            if len(failed_positions):
+                failed_frames.append(assignment_df.iloc[failed_positions])
 
-        orphaned_students = all_assignment_students - students_matched_this_assignment
+        # A student is orphaned when none of their rows matched any section
+        # that was actually searched
+        orphaned = considered & ~student_keys.isin(student_keys[matched_anywhere]).to_numpy()
 
-        if orphaned_students and verbose:
-            print(
-                f"\n   Students not found in any lecture section for this assignment: "
-                f"{len(orphaned_students)}"
-            )
-
-        for _, assign_row in assignment_df.iterrows():
-            assign_student_id = normalize_student_id(assign_row[assign_id_col])
-            assign_username = None
-            if assign_email_col:
-                assign_username = extract_username_from_email(assign_row[assign_email_col])
-
-            student_key = assign_student_id or assign_username
-            if student_key and student_key in orphaned_students:
-                orphaned_df = pd.DataFrame([assign_row.to_dict()])
-                results['orphaned_rows'] = pd.concat(
-                    [results['orphaned_rows'], orphaned_df], ignore_index=True
+        if orphaned.any():
+            if verbose:
+                print(
+                    f"\n   Students not found in any lecture section for this assignment: "
+                    f"{student_keys[orphaned].nunique()}"
                 )
+            orphaned_frames.append(assignment_df[orphaned])
+
+    # Concatenate the collected rows once rather than growing a frame per hit
+    if orphaned_frames:
+        results['orphaned_rows'] = pd.concat(orphaned_frames, ignore_index=True)
+    if failed_frames:
+        results['failed_id_match_rows'] = pd.concat(failed_frames, ignore_index=True)
 
     for lecture_name, df in lecture_dfs.items():
-        lecture_dfs[lecture_name] = sort_assignment_columns(df)
+        lecture_dfs[lecture_name] = sort_assignment_columns(df, results['new_columns'])
 
     results['updated_dataframes'] = lecture_dfs
     return results
@@ -372,28 +450,30 @@ def run_merge(lecture_files, assignment_files, assignment_dir=None,
     print(f"   Matched by Student ID: {results['match_methods']['by_id']}")
     print(f"   Matched by Email: {results['match_methods']['by_email']}")
 
-    # Write output files
+    # Write output files; the CSV writes run on a thread pool while the
+    # next lecture is prepared
     print("\nWriting output files:")
-    for lecture_name, df in results['updated_dataframes'].items():
-        unnamed_cols = [col for col in df.columns if 'Unnamed' in str(col)]
-        if unnamed_cols:
-            df = df.drop(columns=unnamed_cols)
-
-        lec_id_col = find_student_id_column(df)
-        if lec_id_col:
-            df[lec_id_col] = df[lec_id_col].apply(normalize_student_id)
-
-        recompute_averages(df, weights=load_weights_csv(weights_csv) if weights_csv else None)
-        output_name = lecture_name.replace('.csv', '_merged.csv')
-        output_path = out / output_name
-        df.to_csv(output_path, index=False, encoding='utf-8-sig', quoting=csv.QUOTE_ALL)
-        print(f"   {output_path}")
-        stats = results['stats'].get(lecture_name, {})
-        print(f"      Grades updated: {stats.get('grades_updated', 0)}")
-        print(
-            f"      Matched: {stats.get('matched_by_id', 0)} by ID, "
-            f"{stats.get('matched_by_email', 0)} by email"
-        )
+    weights = load_weights_csv(weights_csv) if weights_csv else None
+    writes = []
+    with ThreadPoolExecutor() as pool:
+        for lecture_name, df in results['updated_dataframes'].items():
+            lec_id_col = find_student_id_column(df)
+            if lec_id_col:
+                df[lec_id_col] = normalize_student_id_series(df[lec_id_col])
+
+            recompute_averages(df, weights=weights)
+            output_name = lecture_name.replace('.csv', '_merged.csv')
+            output_path = out / output_name
+            writes.append((output_path, pool.submit(write_gradebook_csv, df, output_path)))
+            print(f"   {output_path}")
+            stats = results['stats'].get(lecture_name, {})
+            print(f"      Grades updated: {stats.get('grades_updated', 0)}")
+            print(
+                f"      Matched: {stats.get('matched_by_id', 0)} by ID, "
+                f"{stats.get('matched_by_email', 0)} by email"
+            )
+    if wait_for_writes(writes):
+        sys.exit(1)
 
     if len(results['orphaned_rows']) > 0:
         orphaned_path = out / 'orphaned_students.csv'
@@ -133,6 +133,7 @@ def run_query(lecture_files, student_id=None, last=None, first=None,
     # misc_cols: [(col_header, value)] for non-assignment, non-identity columns
     sources = []
     identity_fields = {}   # merged across all files
+    pattern_l = column_pattern.lower() if column_pattern is not None else None
 
     for lf in lecture_files:
         lp = Path(lf)
@@ -169,17 +170,17 @@ def run_query(lecture_files, student_id=None, last=None, first=None,
         misc_cols   = []  # (col, value_str) for non-assignment, non-identity
 
         for col in df.columns:
-            if 'Unnamed' in str(col) or _is_identity_col(col):
+            if _is_identity_col(col):
                 continue
             val = row.get(col, '')
             val_str = '' if pd.isna(val) else str(val).strip()
 
             sname = _short_name(col)
             if sname:
-                if column_pattern is None or column_pattern.lower() in sname.lower():
+                if pattern_l is None or pattern_l in sname.lower():
                     assign_vals[sname] = val_str
             else:
-                if column_pattern is None or column_pattern.lower() in col.lower():
+                if pattern_l is None or pattern_l in col.lower():
                     misc_cols.append((col, val_str))
 
         if assign_vals or misc_cols: